@@ -0,0 +1,133 @@
+# aggregates.py
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+# Declarative aggregate engine for the dashboard visuals. The figure code declares the
+# metrics it needs, and compute_aggregates evaluates them in as few passes as possible:
+# - top-N uses partial selection (nlargest), not a full sort of the frame
+# - every mean and count over the same grouping column shares one groupby
+# The result is a dict of small frames keyed by metric key.
+# compute_aggregates_chunked evaluates the same metrics over a stream of chunks,
+# keeping only running top rows and per-group sums/counts between chunks.
+
+
+class Metric(NamedTuple):
+    kind: str
+    key: str
+    column: Optional[str] = None
+    by: Optional[str] = None
+    n: int = 5
+
+
+def top(key, column, n=5):
+    return Metric('top', key, column=column, n=n)
+
+
+def mean_by(key, by, column):
+    return Metric('mean_by', key, column=column, by=by)
+
+
+def count_by(key, by):
+    return Metric('count_by', key, by=by)
+
+
+def dashboard_metrics(schema, with_risk=False, top_n=None):
+    # Metrics behind app.py's ten visuals, given the resolved columns. top_n overrides
+    # the number of rows kept for every top-N metric.
+    metrics = []
+    if schema.has('name', 'salary'):
+        metrics.append(top('top_salary', schema.salary, n=top_n or 5))
+    if schema.has('name', 'present'):
+        metrics.append(top('top_present', schema.present, n=top_n or 5))
+    if schema.has('name', 'absent'):
+        metrics.append(top('top_absent', schema.absent, n=top_n or 5))
+    if schema.has('dept', 'salary'):
+        metrics.append(mean_by('dept_salary', schema.dept, schema.salary))
+    if schema.has('dept'):
+        metrics.append(count_by('dept_count', schema.dept))
+    if schema.has('skill'):
+        metrics.append(count_by('skill_count', schema.skill))
+    if schema.has('dept', 'penalty'):
+        metrics.append(mean_by('dept_penalty', schema.dept, schema.penalty))
+    if with_risk:
+        metrics.append(top('top_risk', 'RiskScore', n=top_n or 10))
+    return metrics
+
+
+def _top_rows(df, column, n):
+    try:
+        return df[column].nlargest(n).index
+    except TypeError:
+        # Object column (mixed types): nlargest needs a numeric dtype
+        return df[column].sort_values(ascending=False).head(n).index
+
+
+def compute_aggregates(df, metrics, label_col=None):
+    results = {}
+    grouped_metrics = defaultdict(list)
+
+    for metric in metrics:
+        if metric.kind == 'top':
+            cols = [c for c in dict.fromkeys([label_col, metric.column]) if c is not None]
+            results[metric.key] = df.loc[_top_rows(df, metric.column, metric.n), cols]
+        elif metric.kind in ('mean_by', 'count_by'):
+            grouped_metrics[metric.by].append(metric)
+        else:
+            raise ValueError(f"Unknown metric kind: {metric.kind}")
+
+    for by, group in grouped_metrics.items():
+        grouped = df.groupby(by, observed=True)
+        mean_cols = list(dict.fromkeys(m.column for m in group if m.kind == 'mean_by'))
+        means = grouped[mean_cols].mean() if mean_cols else None
+        sizes = grouped.size() if any(m.kind == 'count_by' for m in group) else None
+        for metric in group:
+            if metric.kind == 'mean_by':
+                results[metric.key] = means[metric.column].reset_index()
+            else:
+                results[metric.key] = sizes.sort_values(ascending=False).reset_index(name='Count')
+
+    return results
+
+
+def compute_aggregates_chunked(chunks, metrics, label_col=None):
+    tops = {}
+    sums, counts, sizes = {}, {}, {}
+
+    def _add(acc, key, part):
+        acc[key] = part if key not in acc else acc[key].add(part, fill_value=0)
+
+    for chunk in chunks:
+        grouped_metrics = defaultdict(list)
+        for metric in metrics:
+            if metric.kind == 'top':
+                cols = [c for c in dict.fromkeys([label_col, metric.column]) if c is not None]
+                candidates = chunk.loc[_top_rows(chunk, metric.column, metric.n), cols]
+                if metric.key in tops:
+                    candidates = pd.concat([tops[metric.key], candidates], ignore_index=True)
+                tops[metric.key] = candidates.loc[_top_rows(candidates, metric.column, metric.n)]
+            elif metric.kind in ('mean_by', 'count_by'):
+                grouped_metrics[metric.by].append(metric)
+            else:
+                raise ValueError(f"Unknown metric kind: {metric.kind}")
+
+        for by, group in grouped_metrics.items():
+            grouped = chunk.groupby(by, observed=True)
+            mean_cols = list(dict.fromkeys(m.column for m in group if m.kind == 'mean_by'))
+            if mean_cols:
+                _add(sums, by, grouped[mean_cols].sum())
+                _add(counts, by, grouped[mean_cols].count())
+            if any(m.kind == 'count_by' for m in group):
+                _add(sizes, by, grouped.size())
+
+    results = dict(tops)
+    for metric in metrics:
+        if metric.kind == 'mean_by' and metric.by in sums:
+            count = counts[metric.by][metric.column]
+            means = sums[metric.by][metric.column] / count.where(count > 0)
+            results[metric.key] = means.rename(metric.column).sort_index().reset_index()
+        elif metric.kind == 'count_by' and metric.by in sizes:
+            sized = sizes[metric.by].astype(int).sort_values(ascending=False)
+            results[metric.key] = sized.reset_index(name='Count')
+    return results
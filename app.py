@@ -1,13 +1,24 @@
 # app.py
+import os
+
 import dash
 from dash import html, dcc, dash_table, Input, Output, State
-import pandas as pd
 import plotly.express as px
-import base64
-import io
+from upload_spool import current_upload_ids, load_spooled, register_upload_spool, spool_path, upload_error
+from streaming import should_stream, summarize_workbook
+from dataset_store import persist_uploads
+from schema import resolve_schema
+from features import build_feature_frame, add_absent_and_risk
+from figures import scatter
+from aggregates import compute_aggregates, dashboard_metrics
 from prediction import predict_attrition, get_attrition_by_department, forecast_penalty
+from jobs import submit, no_progress, JobCancelled
+from job_ui import job_panel, start_outputs, register_job_callbacks
+from metrics import register_metrics, stage
+from table_paging import register_table
+from view_ui import VIEW_TOP_N_MAX, top_chart, view_panel, register_view_callbacks
 
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, suppress_callback_exceptions=True)
 app.title = "📊 Employee Dataset Dashboard"
 
 app.layout = html.Div([
@@ -24,112 +35,179 @@ app.layout = html.Div([
         },
         multiple=False
     ),
+    dcc.Store(id='upload-ids'),
 
     html.Div(id='uploaded-file-name', style={'textAlign': 'center', 'fontWeight': 'bold'}),
     html.Label("🎛️ Choose header row (0 = top row)", style={'marginLeft': '20px'}),
     dcc.Slider(id='header-row', min=0, max=10, step=1, value=0,
                marks={i: str(i) for i in range(11)}, tooltip={"placement": "bottom"}),
+    dcc.Checklist(id='header-auto', options=[{'label': ' Auto-detect header row', 'value': 'auto'}],
+                  value=[], style={'marginLeft': '20px'}),
 
     html.Br(),
     html.Button("🔍 Analyze File", id='analyze-button', n_clicks=0),
+    job_panel('analysis'),
     html.Div(id='output')
 ])
 
-def decode_excel(content):
-    content_type, content_string = content.split(',')
-    decoded = base64.b64decode(content_string)
-    return io.BytesIO(decoded)
+# The workbook goes to the server once, as raw bytes; callbacks only carry its ID
+register_upload_spool(app)
+register_metrics(app)
 
 @app.callback(
     Output('uploaded-file-name', 'children'),
-    Input('upload-data', 'filename')
+    Input('upload-data', 'filename'),
+    Input('upload-ids', 'data')
 )
-def show_filename(name):
-    return f"✅ File Uploaded: {name}" if name else ""
+def show_filename(name, stored):
+    # The store fills once the POST finishes; a failed upload replaces the name
+    return upload_error(stored, name) or (f"✅ File Uploaded: {name}" if name else "")
 
+# The analysis runs as a background job; the panel polls it and shows the result
 @app.callback(
-    Output('output', 'children'),
+    *start_outputs('analysis'),
     Input('analyze-button', 'n_clicks'),
-    State('upload-data', 'contents'),
+    State('upload-ids', 'data'),
     State('upload-data', 'filename'),
-    State('header-row', 'value')
+    State('header-row', 'value'),
+    State('header-auto', 'value'),
+    prevent_initial_call=True
 )
-def process_uploaded_file(n_clicks, content, filename, header_row):
-    if n_clicks > 0 and content:
+def start_analysis(n_clicks, stored, filename, header_row, header_auto):
+    upload_ids = current_upload_ids(stored, filename)
+    if not filename:
+        return dash.no_update, dash.no_update, ""
+    if upload_ids is None:
+        return dash.no_update, dash.no_update, "⏳ Still uploading…"
+    error = upload_error(stored, filename)
+    if error or not upload_ids[0]:
+        return dash.no_update, dash.no_update, error or "❌ Upload failed"
+    args = (n_clicks, upload_ids[0], filename, header_row, header_auto)
+    return submit('dashboard', process_uploaded_file, *args, key=args[1:]), False, ""
+
+register_job_callbacks(app, 'analysis', 'output')
+# Top-N and department changes update the finished charts in place
+register_view_callbacks(app, 'view')
+
+def dashboard_visuals(agg, schema, df=None):
+    # The ten visuals from the aggregates (the scatter plots also need the rows, df).
+    # Returns (visuals, top-N charts as {key: (value column, title)}).
+    name_col = schema.name
+    dept_col = schema.dept
+    salary_col = schema.salary
+    present_col = schema.present
+    skill_col = schema.skill
+    penalty_col = schema.penalty
+    ot_col = schema.ot
+    visuals = []
+    # Top-N charts, re-sliced by the view controls: (value column, title[, initial top-N])
+    top_charts = {key: spec for key, spec in [
+        ('top_salary', (salary_col, "Top {n} Highest Salary Employees")),
+        ('top_present', (present_col, "Top {n} Most Present Employees")),
+        ('top_absent', (schema.absent, "Top {n} Most Absent Employees")),
+        ('top_risk', ('RiskScore', "Top {n} At-Risk Employees", 10))] if key in agg}
+
+    # 🔟 Ten Visualizations
+    for key in ('top_salary', 'top_present', 'top_absent'):
+        if key in top_charts:
+            visuals.append(top_chart('view', key, agg[key], name_col, *top_charts[key]))
+
+    if 'dept_salary' in agg:
+        fig4 = px.bar(agg['dept_salary'], x=dept_col, y=salary_col, title="Average Salary per Department")
+        visuals.append(dcc.Graph(figure=fig4))
+
+    if 'dept_count' in agg:
+        fig5 = px.pie(agg['dept_count'], names=dept_col, values='Count', title="Department-wise Employee Count")
+        visuals.append(dcc.Graph(figure=fig5))
+
+    if df is not None and salary_col and present_col:
+        fig6 = scatter(df, x=present_col, y=salary_col, title="Attendance vs Salary")
+        visuals.append(dcc.Graph(figure=fig6))
+
+    if 'skill_count' in agg:
+        fig7 = px.pie(agg['skill_count'], names=skill_col, values='Count', title="Skill Distribution")
+        visuals.append(dcc.Graph(figure=fig7))
+
+    if df is not None and ot_col and salary_col:
+        fig8 = scatter(df, x=ot_col, y=salary_col, title="Overtime vs Salary")
+        visuals.append(dcc.Graph(figure=fig8))
+
+    if 'dept_penalty' in agg:
+        fig9 = px.bar(agg['dept_penalty'], x=dept_col, y=penalty_col, title="Average Penalty per Department")
+        visuals.append(dcc.Graph(figure=fig9))
+
+    if 'top_risk' in agg:
+        visuals.append(top_chart('view', 'top_risk', agg['top_risk'], name_col, *top_charts['top_risk']))
+    return visuals, top_charts
+
+def summarize_large_workbook(path, header_row, progress=no_progress):
+    # Workbooks of STREAM_MIN_MB or more are read in chunks (streaming.py) and never
+    # held whole: only the aggregate visuals are shown
+    progress("Summarizing large workbook", 0.05)
+    with stage('stream_summarize', nbytes=os.path.getsize(path)) as s:
+        schema, agg, rows = summarize_workbook(path, header_row, top_n=VIEW_TOP_N_MAX)
+        s.rows = rows
+    if schema is None:
+        return html.Div([html.H4("❌ Error Reading File"), html.Pre("The sheet has no rows")])
+    progress("Building charts", 0.8)
+    with stage('figures'):
+        visuals, top_charts = dashboard_visuals(agg, schema)
+    visuals.insert(0, view_panel('view', None, schema.name, top_charts, agg))
+    visuals.insert(0, html.P(f"📦 Large workbook ({rows:,} rows): summarized chunk by chunk. "
+                             "Row-level charts, the department filter and predictions are skipped."))
+    return html.Div(visuals)
+
+def process_uploaded_file(n_clicks, upload_id, filename, header_row, header_auto, progress=no_progress):
+    if n_clicks > 0 and upload_id:
         try:
-            buffer = decode_excel(content)
-            df = pd.read_excel(buffer, header=header_row)
+            if header_auto:
+                header_row = 'auto'
+            path = spool_path(upload_id)
+            if path is not None and should_stream(path):
+                return summarize_large_workbook(path, header_row, progress)
+
+            progress("Reading workbook", 0.05)
+            frames, errors = load_spooled([upload_id], header_row, [filename])
+            if frames[0] is None:
+                return html.Div([html.H4("❌ Error Reading File"), html.Pre(errors[0][1])])
+            df = frames[0]
             df['SourceFile'] = filename
+            persist_uploads([df], [filename])
 
             # Detect relevant columns
-            name_col = next((c for c in df.columns if 'name' in c.lower()), None)
-            dept_col = next((c for c in df.columns if 'depart' in c.lower() or 'plant' in c.lower()), None)
-            salary_col = next((c for c in df.columns if 'net' in c.lower() and 'salary' in c.lower()), None)
-            present_col = next((c for c in df.columns if 'present' in c.lower()), None)
-            absent_col = next((c for c in df.columns if 'absent' in c.lower()), None)
-            penalty_col = next((c for c in df.columns if 'penalt' in c.lower()), None)
-            skill_col = next((c for c in df.columns if 'skill' in c.lower()), None)
-            ot_col = next((c for c in df.columns if 'ot' in c.lower() or 'overtime' in c.lower()), None)
-            total_days_col = next((c for c in df.columns if 'total' in c.lower() and 'day' in c.lower()), None)
-
-            if absent_col is None and present_col and total_days_col:
-                df['Absent'] = df[total_days_col] - df[present_col]
-                absent_col = 'Absent'
-
-            visuals = []
-
-            # 🔟 Ten Visualizations
-            if name_col and salary_col:
-                fig1 = px.bar(df.sort_values(by=salary_col, ascending=False).head(5), x=name_col, y=salary_col, title="Top 5 Highest Salary Employees")
-                visuals.append(dcc.Graph(figure=fig1))
-
-            if name_col and present_col:
-                fig2 = px.bar(df.sort_values(by=present_col, ascending=False).head(5), x=name_col, y=present_col, title="Top 5 Most Present Employees")
-                visuals.append(dcc.Graph(figure=fig2))
-
-            if name_col and absent_col:
-                fig3 = px.bar(df.sort_values(by=absent_col, ascending=False).head(5), x=name_col, y=absent_col, title="Top 5 Most Absent Employees")
-                visuals.append(dcc.Graph(figure=fig3))
-
-            if dept_col and salary_col:
-                fig4 = px.bar(df.groupby(dept_col)[salary_col].mean().reset_index(), x=dept_col, y=salary_col, title="Average Salary per Department")
-                visuals.append(dcc.Graph(figure=fig4))
-
-            if dept_col:
-                dept_count = df[dept_col].value_counts().reset_index()
-                dept_count.columns = [dept_col, 'Count']
-                fig5 = px.pie(dept_count, names=dept_col, values='Count', title="Department-wise Employee Count")
-                visuals.append(dcc.Graph(figure=fig5))
-
-            if salary_col and present_col:
-                fig6 = px.scatter(df, x=present_col, y=salary_col, title="Attendance vs Salary")
-                visuals.append(dcc.Graph(figure=fig6))
-
-            if skill_col:
-                skill_count = df[skill_col].value_counts().reset_index()
-                skill_count.columns = [skill_col, 'Count']
-                fig7 = px.pie(skill_count, names=skill_col, values='Count', title="Skill Distribution")
-                visuals.append(dcc.Graph(figure=fig7))
-
-            if ot_col and salary_col:
-                fig8 = px.scatter(df, x=ot_col, y=salary_col, title="Overtime vs Salary")
-                visuals.append(dcc.Graph(figure=fig8))
-
-            if dept_col and penalty_col:
-                penalty_avg = df.groupby(dept_col)[penalty_col].mean().reset_index()
-                fig9 = px.bar(penalty_avg, x=dept_col, y=penalty_col, title="Average Penalty per Department")
-                visuals.append(dcc.Graph(figure=fig9))
-
-            if absent_col and penalty_col and salary_col:
-                df['RiskScore'] = (df[absent_col] + df[penalty_col]) / (df[salary_col] + 1)
-                top_risk = df.sort_values(by='RiskScore', ascending=False).head(10)
-                fig10 = px.bar(top_risk, x=name_col, y='RiskScore', title="Top 10 At-Risk Employees")
-                visuals.append(dcc.Graph(figure=fig10))
+            with stage('column_detect'):
+                schema = resolve_schema(df)
+            dept_col = schema.dept
+
+            with stage('derived_columns', rows=len(df)):
+                schema = add_absent_and_risk(df, schema)
+
+            # Declare what the visuals need, then compute it in one go
+            progress("Aggregating", 0.3)
+            with stage('aggregates', rows=len(df)):
+                agg = compute_aggregates(df, dashboard_metrics(schema, with_risk='RiskScore' in df.columns,
+                                                               top_n=VIEW_TOP_N_MAX), label_col=schema.name)
+
+            progress("Building charts", 0.45)
+            charts = stage('figures', rows=len(df)).start()
+            visuals, top_charts = dashboard_visuals(agg, schema, df)
+
+            # The department filter recomputes the top-N rows from this frame
+            view_cols = list(dict.fromkeys(c for c in [schema.name, dept_col] + [c for c, *_ in top_charts.values()]
+                                           if c is not None))
+            departments = sorted(df[dept_col].dropna().astype(str).unique()) if dept_col else ()
+            visuals.insert(0, view_panel('view', register_table(df[view_cols]), schema.name, top_charts, agg,
+                                         dept_col, departments))
+            charts.stop()
 
             # 🧠 Predictions Below
             visuals.append(html.Hr())
             visuals.append(html.H3("🔮 Attrition Prediction"))
-            risky_employees = predict_attrition(df)
+            progress("Training attrition model", 0.6)
+            with stage('feature_frame', rows=len(df)):
+                features = build_feature_frame(df, schema)
+            with stage('predict_attrition', rows=len(df)):
+                risky_employees = predict_attrition(df, schema, features)
             visuals.append(dash_table.DataTable(
                 data=risky_employees.to_dict('records'),
                 columns=[{"name": i, "id": i} for i in risky_employees.columns],
@@ -137,7 +215,8 @@ def process_uploaded_file(n_clicks, content, filename, header_row):
             ))
 
             visuals.append(html.H3("🏢 Department-wise Risk"))
-            dept_risk = get_attrition_by_department(df)
+            with stage('attrition_by_department', rows=len(df)):
+                dept_risk = get_attrition_by_department(df, schema, features)
             visuals.append(dash_table.DataTable(
                 data=dept_risk.to_dict('records'),
                 columns=[{"name": i, "id": i} for i in dept_risk.columns],
@@ -145,7 +224,9 @@ def process_uploaded_file(n_clicks, content, filename, header_row):
             ))
 
             visuals.append(html.H3("📉 Penalty Forecast"))
-            penalty_df = forecast_penalty(df)
+            progress("Forecasting penalties", 0.85)
+            with stage('forecast_penalty', rows=len(df)):
+                penalty_df = forecast_penalty(df, schema, features)
             visuals.append(dash_table.DataTable(
                 data=penalty_df.to_dict('records'),
                 columns=[{"name": i, "id": i} for i in penalty_df.columns],
@@ -154,6 +235,8 @@ def process_uploaded_file(n_clicks, content, filename, header_row):
 
             return html.Div(visuals)
 
+        except JobCancelled:
+            raise
         except Exception as e:
             return html.Div([html.H4("❌ Error Reading File"), html.Pre(str(e))])
     return ""
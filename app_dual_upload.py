@@ -1,31 +1,21 @@
-import base64
-import io
 import pandas as pd
-from dash import Dash, dcc, html, Input, Output, State, ctx, dash_table
+from dash import Dash, dcc, html, Input, Output, State, ctx, dash_table, no_update
 import dash_bootstrap_components as dbc
+from ingest import memory_saved
+from upload_spool import current_upload_ids, load_spooled, register_upload_spool, upload_error
+from preprocess import normalize_dtypes
+from dataset_store import persist_uploads
+from schema import resolve_schema
+from table_paging import register_table, get_page
+from jobs import submit, no_progress
+from job_ui import job_panel, start_outputs, register_job_callbacks
+from metrics import register_metrics, stage
+from view_ui import view_panel, register_view_callbacks
 
 # Dash App Init
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True)
 app.title = "📊 Employee Attendance & Attrition Analyzer"
 
-# Helper to decode uploaded files
-def parse_contents(contents, filename):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    try:
-        if 'xls' in filename:
-            df = pd.read_excel(io.BytesIO(decoded), header=None)
-            # Detect proper header row
-            for i in range(3):
-                df_try = pd.read_excel(io.BytesIO(decoded), header=i)
-                if any(name.lower() in str(col).lower() for col in df_try.columns for name in ['name', 'employee name', 'emp name']):
-                    df = df_try.copy()
-                    break
-            df['SourceFile'] = filename
-            return df
-    except Exception as e:
-        return pd.DataFrame([{"Error": f"Could not parse file {filename}: {e}"}])
-
 # Layout
 app.layout = dbc.Container([
     html.H2("Employee Dataset Analyzer (Single & Multi-Upload)"),
@@ -43,6 +33,8 @@ app.layout = dbc.Container([
     html.Br(),
 
     html.Div(id='upload-section'),
+    dcc.Store(id='upload-ids'),
+    job_panel('analysis'),
     html.Div(id='output-analysis')
 ], fluid=True)
 
@@ -66,37 +58,67 @@ def render_upload_section(mode):
         dbc.Button("Run Analysis", id='analyze-button', color='primary')
     ])
 
-# Core Logic: Parse and Analyze
+# Workbooks go to the server once, as raw bytes; callbacks only carry their IDs
+register_upload_spool(app)
+register_metrics(app)
+
+# Core Logic: Parse and Analyze (as a background job; the panel polls for the result)
 @app.callback(
-    Output('output-analysis', 'children'),
+    *start_outputs('analysis'),
     Input('analyze-button', 'n_clicks'),
-    State('upload-data', 'contents'),
+    State('upload-ids', 'data'),
     State('upload-data', 'filename'),
     prevent_initial_call=True
 )
-def analyze_uploaded_files(n_clicks, list_of_contents, list_of_names):
-    if not list_of_contents:
+def start_analysis(n_clicks, stored, list_of_names):
+    upload_ids = current_upload_ids(stored, list_of_names)
+    if list_of_names and upload_ids is None:
+        return no_update, no_update, "⏳ Still uploading…"
+    error = upload_error(stored, list_of_names)
+    if error:
+        return no_update, no_update, error
+    args = (n_clicks, upload_ids, list_of_names)
+    return submit('dual', analyze_uploaded_files, *args, key=args[1:]), False, ""
+
+register_job_callbacks(app, 'analysis', 'output-analysis')
+# The department filter narrows the finished table in place
+register_view_callbacks(app, 'view', table_id='analysis-table')
+
+def analyze_uploaded_files(n_clicks, upload_ids, list_of_names, progress=no_progress):
+    if not upload_ids:
         return dbc.Alert("❌ No file uploaded!", color='danger')
 
-    if isinstance(list_of_contents, str):  # Single file string
-        list_of_contents = [list_of_contents]
+    if isinstance(list_of_names, str):  # Single file string
         list_of_names = [list_of_names]
 
-    dfs = []
-    for content, name in zip(list_of_contents, list_of_names):
-        df = parse_contents(content, name)
-        if 'Error' in df.columns:
-            return dbc.Alert(df['Error'].iloc[0], color='danger')
-        dfs.append(df)
+    # Files are parsed in parallel; failures are reported per file
+    progress("Reading workbooks", 0.05)
+    excel = [(upload_id, name) for upload_id, name in zip(upload_ids, list_of_names) if 'xls' in name]
+    errors = [(name, "Not an Excel file") for name in list_of_names if 'xls' not in name]
+    frames, parse_errors = load_spooled([u for u, _ in excel], 'auto', [n for _, n in excel])
+    errors += parse_errors
 
+    dfs = []
+    for (_, name), df in zip(excel, frames):
+        if df is not None:
+            df['SourceFile'] = name
+            dfs.append(df)
+    persist_uploads(frames, [n for _, n in excel])
+    if not dfs:
+        return dbc.Alert([html.Div(f"Could not parse file {name}: {message}") for name, message in errors],
+                         color='danger')
+
+    progress("Analyzing", 0.5)
     combined_df = pd.concat(dfs, ignore_index=True)
-    combined_df.fillna('', inplace=True)
 
     # Auto-detect name and attendance columns
-    name_col = next((col for col in combined_df.columns if 'name' in str(col).lower()), None)
-    present_col = next((col for col in combined_df.columns if 'present' in str(col).lower()), None)
-    total_col = next((col for col in combined_df.columns if 'total' in str(col).lower() and 'day' in str(col).lower()), None)
-    penalty_col = next((col for col in combined_df.columns if 'penalt' in str(col).lower()), None)
+    with stage('column_detect'):
+        schema = resolve_schema(combined_df)
+    name_col = schema.name
+    dept_col = schema.dept
+    present_col = schema.present
+    total_col = schema.total_days
+    penalty_col = schema.penalty
 
     if not all([name_col, present_col, total_col]):
         return dbc.Alert("❌ Required columns (Name, Present, Total Days) not found.", color='danger')
@@ -105,21 +127,56 @@ def analyze_uploaded_files(n_clicks, list_of_contents, list_of_names):
     if penalty_col:
         combined_df['Penalty/Salary Ratio'] = round(combined_df[penalty_col] / (combined_df[penalty_col].max() + 1), 2)
 
+    with stage('normalize_dtypes', rows=len(combined_df)):
+        combined_df, dtype_report = normalize_dtypes(combined_df)
+    # Most of the saving happened when ingest compacted each workbook
+    saved = memory_saved(frames) + dtype_report['saved']
+
+    # Rows stay on the server; the table requests one page at a time
+    table_cols = [name_col] + ([dept_col] if dept_col else []) + [present_col, total_col, 'Present %'] + \
+        ([penalty_col] if penalty_col else [])
+    table_id = register_table(combined_df[table_cols])
     table = dash_table.DataTable(
-        data=combined_df[[name_col, present_col, total_col, 'Present %'] + ([penalty_col] if penalty_col else [])].to_dict('records'),
-        columns=[{"name": i, "id": i} for i in [name_col, present_col, total_col, 'Present %'] + ([penalty_col] if penalty_col else [])],
+        id='analysis-table',
+        columns=[{"name": i, "id": i} for i in table_cols],
         style_table={'overflowX': 'auto'},
         style_cell={
             'minWidth': '150px', 'whiteSpace': 'normal', 'textAlign': 'center'
         },
-        page_size=15
+        page_current=0,
+        page_size=15,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='single',
+        sort_by=[],
+        filter_action='custom',
+        filter_query=''
     )
 
     return html.Div([
+        dbc.Alert([html.Div(f"Skipped {name}: {message}") for name, message in errors],
+                  color='warning') if errors else html.Div(),
         html.H5(f"📋 Total Employees: {len(combined_df)}"),
+        html.Small(f"🗜️ Dataset memory: {(dtype_report['after'] + saved) / 1e6:.1f} MB → "
+                   f"{dtype_report['after'] / 1e6:.1f} MB"),
         html.Hr(),
+        view_panel('view', table_id, name_col, {}, {}, dept_col,
+                   sorted(combined_df[dept_col].dropna().astype(str).unique()) if dept_col else ()),
+        dcc.Store(id='analysis-table-id', data=table_id),
         table
     ])
 
+@app.callback(
+    Output('analysis-table', 'data'),
+    Output('analysis-table', 'page_count'),
+    Input('analysis-table', 'page_current'),
+    Input('analysis-table', 'page_size'),
+    Input('analysis-table', 'sort_by'),
+    Input('analysis-table', 'filter_query'),
+    State('analysis-table-id', 'data')
+)
+def update_analysis_table(page_current, page_size, sort_by, filter_query, table_id):
+    return get_page(table_id, page_current, page_size, sort_by, filter_query)
+
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    app.run(debug=True)
@@ -1,44 +1,38 @@
 import dash
 from dash import dcc, html, Input, Output, State, ctx, dash_table
 import dash_bootstrap_components as dbc
-import base64
-import io
 import pandas as pd
 import plotly.express as px
-from sklearn.preprocessing import MinMaxScaler
 import os
+from ingest import clean_columns, memory_saved
+from upload_spool import current_upload_ids, load_spooled, register_upload_spool, upload_error
+from preprocess import detect_period_from_filename, normalize_dtypes
+from dataset_store import persist_uploads, read_history, store_available
+from month_aggregates import rollups
+from schema import ColumnSchema, resolve_schema
+from risk_rules import evaluate
+from table_paging import register_table, get_page
+from figures import scatter, histogram
+from aggregates import compute_aggregates, count_by
+from identity import assign_employee_ids
+from features import build_feature_frame
+from prediction import predict_attrition, forecast_penalty, forecast_penalty_trend
+from jobs import submit, no_progress
+from job_ui import job_panel, start_outputs, register_job_callbacks
+from metrics import register_metrics, stage
+from view_ui import top_chart, top_metrics, view_panel, register_view_callbacks
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SANDSTONE])
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SANDSTONE], suppress_callback_exceptions=True)
 app.title = "Employee Analysis Dashboard"
 
-def clean_columns(df):
-    seen = {}
-    new_cols = []
-    for col in df.columns:
-        col = col.strip()
-        if col in seen:
-            seen[col] += 1
-            new_cols.append(f"{col}_{seen[col]}")
-        else:
-            seen[col] = 0
-            new_cols.append(col)
-    df.columns = new_cols
-    return df
-
-def process_file(contents, header_row):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    try:
-        df = pd.read_excel(io.BytesIO(decoded), header=header_row)
-        df = clean_columns(df)
-        return df
-    except:
-        return None
+# Absence bands come from the shared rules in risk_rules.py ('AbsentRatio', 'Risk Status')
+RISK_SCHEMA = ColumnSchema(name='EmployeeName', total_days='Total Days', present='Present Days', absent='Absent Days')
 
 def classify_risk(df):
     df['Absent Days'] = df['Total Days'] - df['Present Days']
-    df['Absent Ratio'] = df['Absent Days'] / df['Total Days']
-    df['Risk Status'] = df['Absent Ratio'].apply(lambda x: 'High Risk' if x >= 0.3 else 'Medium' if x >= 0.15 else 'Low Risk')
+    risk = evaluate(df, RISK_SCHEMA, ['AbsentRatio', 'Risk Status'])
+    df['Absent Ratio'] = risk['AbsentRatio']
+    df['Risk Status'] = risk['Risk Status']
     return df
 
 app.layout = dbc.Container([
@@ -49,103 +43,273 @@ app.layout = dbc.Container([
         style={'border': '2px dashed #aaa', 'padding': '30px', 'textAlign': 'center'},
         multiple=True
     ),
+    dcc.Store(id='upload-ids'),
     html.Label("Choose header row (0 = top row)"),
-    dcc.Dropdown(id='header-row', options=[{"label": str(i), "value": i} for i in range(11)], value=0),
+    dcc.Dropdown(id='header-row', options=[{"label": "Auto-detect", "value": "auto"}] +
+                 [{"label": str(i), "value": i} for i in range(11)], value=0),
+    # Workbooks analyzed before are read back from the dataset store, not re-uploaded
+    dcc.Checklist(id='use-history', options=[{"label": " Include stored history", "value": "history"}],
+                  value=[], className="mt-2"),
     html.Br(),
     dbc.Button("📊 Analyze Files", id="analyze-btn", color="primary"),
+    job_panel('analysis'),
     html.Hr(),
     html.Div(id='output-area')
 ])
 
+# Workbooks go to the server once, as raw bytes; callbacks only carry their IDs
+register_upload_spool(app)
+register_metrics(app)
+
+# The analysis runs as a background job; the panel polls it and shows the result
 @app.callback(
-    Output('output-area', 'children'),
+    *start_outputs('analysis'),
     Input("analyze-btn", "n_clicks"),
-    State("upload-data", "contents"),
+    State("upload-ids", "data"),
     State("upload-data", "filename"),
     State("header-row", "value"),
+    State("use-history", "value"),
     prevent_initial_call=True
 )
-def analyze_data(n_clicks, contents, filenames, header_row):
-    if contents is None:
+def start_analysis(n_clicks, stored, filenames, header_row, use_history):
+    upload_ids = current_upload_ids(stored, filenames)
+    if filenames and upload_ids is None:
+        return dash.no_update, dash.no_update, "⏳ Still uploading…"
+    error = upload_error(stored, filenames)
+    if error:
+        return dash.no_update, dash.no_update, error
+    args = (n_clicks, upload_ids, filenames, header_row, use_history)
+    return submit('multi', analyze_data, *args, key=args[1:]), False, ""
+
+register_job_callbacks(app, 'analysis', 'output-area')
+# Top-N and department changes update the finished charts and table in place
+register_view_callbacks(app, 'view', table_id='insights-table')
+
+# Schema roles read back from the dataset store for a history analysis
+HISTORY_ROLES = ('name', 'emp_no', 'dept', 'total_days', 'present', 'salary', 'basic_salary', 'bonus', 'penalty')
+
+# Detected columns are renamed to the names the visuals below use
+CANONICAL = {'name': 'EmployeeName', 'total_days': 'Total Days', 'present': 'Present Days',
+             'basic_salary': 'Basic salary', 'bonus': 'Bonus', 'penalty': 'Penalty'}
+
+# Top-N charts: {key: (value column, title)}
+TOP_CHARTS = {
+    'top_present': ('Present Days', "✅ Top {n} Present Employees"),
+    'top_absent': ('Absent Days', "❌ Top {n} Absent Employees"),
+    'top_salary': ('Basic salary', "💰 Top {n} Salaries"),
+    'top_bonus': ('Bonus', "🎁 Top {n} Bonuses"),
+    'top_penalty': ('Penalty', "🚫 Top {n} Penalty Earners"),
+    'top_attendance': ('Attendance %', "📈 Attendance % of Top {n} Employees"),
+}
+
+def analyze_data(n_clicks, upload_ids, filenames, header_row, use_history=(), progress=no_progress):
+    history = 'history' in (use_history or ()) and store_available()
+    if upload_ids is None and not history:
         return html.Div("⚠️ No files uploaded")
 
-    # Load & Merge
+    progress("Reading workbooks", 0.05)
+    # Load & Merge (files are parsed in parallel; a bad file is reported, not fatal)
+    filenames = filenames or [f"file {i + 1}" for i in range(len(upload_ids or ()))]
+    frames, errors = load_spooled(upload_ids, header_row, filenames) if upload_ids else ([], [])
     dfs = []
-    for content in contents:
-        df = process_file(content, header_row)
-        if df is not None:
+    for name, df in zip(filenames, frames):
+        if df is None:
+            continue
+        try:
+            df = clean_columns(df)
+            df['SourceFile'] = name
             dfs.append(df)
+        except Exception as e:
+            errors.append((name, str(e)))
+    rollup = None
+    if history:
+        # Department totals across every stored month, merged from per-month partials
+        with stage('month_rollups'):
+            rollup = rollups(dfs, exclude_sources=filenames).get('dept')
+        # Stored workbooks come back memory-mapped, only the columns analyzed below; a
+        # fresh upload of the same file wins
+        stored = read_history(HISTORY_ROLES, exclude_sources=filenames)
+        if len(stored):
+            dfs.append(stored)
     if not dfs:
         return html.Div("❌ Could not load any files")
+    persist_uploads(frames, filenames)
     df = pd.concat(dfs, ignore_index=True)
     
     # Normalize column names
     df.columns = df.columns.str.strip()
-    name_col = next((col for col in df.columns if 'name' in col.lower()), None)
-    if name_col is None or 'Total Days' not in df.columns or 'Present Days' not in df.columns:
+    with stage('column_detect'):
+        schema = resolve_schema(df)
+    if not schema.has('name', 'total_days', 'present'):
         return html.Div("❌ Required columns missing: 'Employee Name', 'Total Days', 'Present Days'")
-    
-    df = df.rename(columns={name_col: 'EmployeeName'})
+
+    # Map detected columns onto the names the visuals below use
+    canonical = {role: new for role, new in CANONICAL.items() if getattr(schema, role) is not None}
+    df = df.rename(columns={getattr(schema, role): new for role, new in canonical.items()})
+    schema = schema.with_columns(**canonical)
     df = df[df['EmployeeName'].notna()]
+    periods = {source: detect_period_from_filename(str(source)) for source in df['SourceFile'].unique()}
+    df['UploadPeriod'] = df['SourceFile'].map(periods)
+    progress("Resolving employees", 0.35)
+    with stage('identity_resolve', rows=len(df)):
+        # Keyed by employee number when the workbooks have one; names in the same file
+        # or month are never merged
+        df['EmployeeID'] = assign_employee_ids(df['EmployeeName'],
+                                               df[schema.emp_no] if schema.emp_no else None,
+                                               groups=[df['SourceFile'], df['UploadPeriod']])
 
     # Calculate insights
     df['Absent Days'] = df['Total Days'] - df['Present Days']
     df['Attendance %'] = (df['Present Days'] / df['Total Days']) * 100
     df['Absent %'] = 100 - df['Attendance %']
-    df = classify_risk(df)
+    with stage('derived_columns', rows=len(df)):
+        df = classify_risk(df)
+    with stage('normalize_dtypes', rows=len(df)):
+        df, dtype_report = normalize_dtypes(df)
+    # Most of the saving happened when ingest compacted each workbook
+    saved = memory_saved(frames) + dtype_report['saved']
 
-    top_present = df.sort_values(by='Present Days', ascending=False).head(5)
-    top_absent = df.sort_values(by='Absent Days', ascending=False).head(5)
-    
+    progress("Aggregating", 0.55)
+    aggregating = stage('aggregates', rows=len(df)).start()
+    agg = compute_aggregates(df, [count_by('risk_count', 'Risk Status')] + top_metrics(TOP_CHARTS),
+                             label_col='EmployeeName')
+    aggregating.stop()
+
+    progress("Building charts", 0.7)
+    charts = stage('figures', rows=len(df)).start()
     graphs = [
-        dcc.Graph(figure=px.bar(df.groupby("Risk Status").size().reset_index(name="Count"),
+        dcc.Graph(figure=px.bar(agg['risk_count'],
                                 x="Risk Status", y="Count", title="🛑 Risk Category Count")),
 
-        dcc.Graph(figure=px.pie(df, names="Risk Status", title="🧠 Risk Distribution Pie Chart")),
+        dcc.Graph(figure=px.pie(agg['risk_count'], names="Risk Status", values="Count",
+                                title="🧠 Risk Distribution Pie Chart")),
 
-        dcc.Graph(figure=px.bar(top_present, x='EmployeeName', y='Present Days',
-                                title="✅ Top 5 Present Employees")),
+        top_chart('view', 'top_present', agg['top_present'], 'EmployeeName', *TOP_CHARTS['top_present']),
 
-        dcc.Graph(figure=px.bar(top_absent, x='EmployeeName', y='Absent Days',
-                                title="❌ Top 5 Absent Employees")),
+        top_chart('view', 'top_absent', agg['top_absent'], 'EmployeeName', *TOP_CHARTS['top_absent']),
 
-        dcc.Graph(figure=px.scatter(df, x="Present Days", y="Basic salary",
-                                    color="Risk Status", title="📉 Present Days vs Salary")),
+        dcc.Graph(figure=scatter(df, x="Present Days", y="Basic salary",
+                                 color="Risk Status", title="📉 Present Days vs Salary")),
 
-        dcc.Graph(figure=px.histogram(df, x="Attendance %", nbins=10,
-                                      title="⏱ Attendance % Distribution")),
+        dcc.Graph(figure=histogram(df, x="Attendance %", nbins=10,
+                                   title="⏱ Attendance % Distribution")),
 
-        dcc.Graph(figure=px.bar(df.sort_values(by="Basic salary", ascending=False).head(5),
-                                x='EmployeeName', y='Basic salary', title="💰 Top 5 Salaries")),
+        top_chart('view', 'top_salary', agg['top_salary'], 'EmployeeName', *TOP_CHARTS['top_salary']),
 
-        dcc.Graph(figure=px.bar(df.sort_values(by="Bonus", ascending=False).head(5),
-                                x='EmployeeName', y='Bonus', title="🎁 Top 5 Bonuses")),
+        top_chart('view', 'top_bonus', agg['top_bonus'], 'EmployeeName', *TOP_CHARTS['top_bonus']),
 
-        dcc.Graph(figure=px.bar(df.sort_values(by="Penalty", ascending=False).head(5),
-                                x='EmployeeName', y='Penalty', title="🚫 Top 5 Penalty Earners")),
+        top_chart('view', 'top_penalty', agg['top_penalty'], 'EmployeeName', *TOP_CHARTS['top_penalty']),
 
-        dcc.Graph(figure=px.line(df.sort_values(by="Attendance %", ascending=False).head(5),
-                                 x='EmployeeName', y='Attendance %',
-                                 title="📈 Attendance % of Top 5 Employees"))
+        top_chart('view', 'top_attendance', agg['top_attendance'], 'EmployeeName',
+                  *TOP_CHARTS['top_attendance'], plot=px.line)
     ]
+    charts.stop()
+
+    progress("Predicting attrition", 0.8)
+    # With several months (or the stored history) the incrementally grown forest of
+    # these source files is updated with only the new or changed months
+    multi_month = history or df['UploadPeriod'].nunique() > 1
+    with stage('feature_frame', rows=len(df)):
+        features = build_feature_frame(df, schema)
+    with stage('predict_attrition', rows=len(df)):
+        if multi_month:
+            risky = predict_attrition(df, schema, features, months=df['UploadPeriod'], sources=df['SourceFile'])
+        else:
+            risky = predict_attrition(df, schema, features)
+    # Per-employee penalty trend over the months; a single file has no series to fit
+    if multi_month:
+        with stage('forecast_penalty_trend', rows=len(df)):
+            forecast = forecast_penalty_trend(df, schema).head(10).round(2)
+        forecast_title = "📈 Penalty Trend Forecast (Next Month)"
+    else:
+        with stage('forecast_penalty', rows=len(df)):
+            forecast = forecast_penalty(df, schema, features).round(2)
+        forecast_title = "📈 Penalty Forecast"
+
+    # The department filter recomputes the top-N rows from this frame
+    dept_col = schema.dept if schema.dept in df.columns else None
+    view_cols = ['EmployeeName'] + ([dept_col] if dept_col else []) + [c for c, _ in TOP_CHARTS.values()]
+    departments = sorted(df[dept_col].dropna().astype(str).unique()) if dept_col else ()
+    view = view_panel('view', register_table(df[view_cols]), 'EmployeeName', TOP_CHARTS, agg, dept_col, departments)
 
+    # Rows stay on the server; the table requests one page at a time
+    table_cols = ['EmployeeName'] + ([dept_col] if dept_col else []) + \
+        ['Total Days', 'Present Days', 'Absent Days', 'Attendance %', 'Basic salary', 'Risk Status']
+    table_id = register_table(df[table_cols])
     table = dash_table.DataTable(
-        data=df[['EmployeeName', 'Total Days', 'Present Days', 'Absent Days', 'Attendance %', 'Basic salary', 'Risk Status']].to_dict('records'),
+        id='insights-table',
+        columns=[{"name": i, "id": i} for i in table_cols],
+        page_current=0,
         page_size=10,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='single',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
         style_table={'overflowX': 'auto'},
         style_cell={'textAlign': 'left'},
         style_header={'backgroundColor': 'lightblue', 'fontWeight': 'bold'}
     )
 
     return html.Div([
-        html.H4(f"📋 Total Employees: {df['EmployeeName'].nunique()}"),
+        html.Div([html.Div(f"⚠️ Skipped {name}: {message}") for name, message in errors]),
+        html.H4(f"📋 Total Employees: {df.loc[df['EmployeeID'] >= 0, 'EmployeeID'].nunique()}"),
+        html.Small(f"🗜️ Dataset memory: {(dtype_report['after'] + saved) / 1e6:.1f} MB → "
+                   f"{dtype_report['after'] / 1e6:.1f} MB"),
+        view,
         html.H5("📌 Sample Insights Table"),
+        dcc.Store(id='insights-table-id', data=table_id),
         table,
+        html.Div(month_rollup_table(rollup) if rollup is not None else []),
         html.Hr(),
         html.H4("📊 Insights & Visuals"),
-        html.Div(graphs)
+        html.Div(graphs),
+        html.Hr(),
+        html.H4("🔮 Attrition Prediction (Top 10 Risky Employees)"),
+        dash_table.DataTable(
+            data=risky.to_dict('records'),
+            columns=[{"name": i, "id": i} for i in risky.columns],
+            page_size=10,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left'}
+        ),
+        html.H4(forecast_title),
+        dash_table.DataTable(
+            data=forecast.to_dict('records'),
+            columns=[{"name": i, "id": i} for i in forecast.columns],
+            page_size=10,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left'}
+        )
     ])
 
+def month_rollup_table(rollup):
+    columns = ['Department'] + [c for c in rollup.columns if c.endswith(('_sum', '_mean'))]
+    return [
+        html.H5("📆 Department Roll-up Across Stored Months"),
+        dash_table.DataTable(
+            data=rollup[columns].round(2).to_dict('records'),
+            columns=[{"name": c, "id": c} for c in columns],
+            page_size=10,
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left'},
+            style_header={'backgroundColor': 'lightblue', 'fontWeight': 'bold'}
+        ),
+    ]
+
+@app.callback(
+    Output('insights-table', 'data'),
+    Output('insights-table', 'page_count'),
+    Input('insights-table', 'page_current'),
+    Input('insights-table', 'page_size'),
+    Input('insights-table', 'sort_by'),
+    Input('insights-table', 'filter_query'),
+    State('insights-table-id', 'data')
+)
+def update_insights_table(page_current, page_size, sort_by, filter_query, table_id):
+    return get_page(table_id, page_current, page_size, sort_by, filter_query)
+
 if __name__ == "__main__":
      port = int(os.environ.get("PORT", 8050))
      app.run(host="0.0.0.0", port=port, debug=True)
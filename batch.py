@@ -0,0 +1,178 @@
+# batch.py
+import argparse
+import glob
+import os
+import sys
+import time
+
+import pandas as pd
+
+import ingest
+from ingest import clean_columns, load_files
+from preprocess import arrow_compatible, clean_and_label, normalize_dtypes
+from schema import resolve_schema
+from features import add_absent_and_risk, build_feature_frame
+from identity import assign_employee_ids
+from prediction import predict_attrition, get_attrition_by_department, forecast_penalty, forecast_penalty_trend
+
+# Headless batch mode: the dashboard analysis over a directory of workbooks, without
+# Dash. Workbooks are parsed in parallel (ingest's process pool), labeled with
+# clean_and_label, and the cleaned summary, risk tables and forecasts are written to
+# the output directory, one file per table:
+#   python batch.py plants/ -o out/ --format parquet
+# --store keeps the parsed workbooks in the dataset store; --history re-runs over them
+# later without the Excel files, reading back only the columns the analysis uses, and
+# adds department and employee roll-ups across all months (month_aggregates):
+#   python batch.py --history -o out/
+EXCEL_PATTERNS = ('*.xlsx', '*.xlsm', '*.xls')
+FORMATS = ('parquet', 'feather', 'csv', 'xlsx')
+EXCEL_MAX_ROWS = 1048575
+# Schema roles read back from the dataset store with --history (build_summary, the
+# models and the forecasts use no other columns)
+HISTORY_ROLES = ('name', 'emp_no', 'dept', 'salary', 'basic_salary', 'present', 'absent', 'total_days', 'penalty',
+                 'skill', 'ot', 'bonus')
+
+
+def find_workbooks(directory):
+    paths = set()
+    for pattern in EXCEL_PATTERNS:
+        paths.update(glob.glob(os.path.join(directory, pattern)))
+    # Skip Excel lock files (~$book.xlsx) left by open workbooks
+    return sorted(p for p in paths if not os.path.basename(p).startswith('~$'))
+
+
+def build_summary(df, schema):
+    # Cleaned summary in the layout of cleaned_attendance_summary.xlsx, plus EmployeeID
+    # and the dashboard's RiskScore
+    schema = add_absent_and_risk(df, schema)
+    if schema.has('present', 'total_days'):
+        present = pd.to_numeric(df[schema.present], errors='coerce')
+        total = pd.to_numeric(df[schema.total_days], errors='coerce')
+        df['Absent Days'] = total - present
+        df['Present %'] = (present / total.where(total > 0) * 100).round(2)
+        df['Absent %'] = (100 - df['Present %']).round(2)
+    if schema.name is not None:
+        df['EmployeeID'] = assign_employee_ids(df[schema.name], df[schema.emp_no] if schema.emp_no else None,
+                                               groups=[df['SourceFile'], df['UploadPeriod']])
+    return df, schema
+
+
+def analyze(paths, header_row='auto', history=False):
+    # Returns ({table name: DataFrame}, [(file, error), ...]). With history, workbooks in
+    # the dataset store are analyzed too (a file in `paths` replaces its stored copy).
+    filenames = [os.path.basename(p) for p in paths]
+    frames, errors = load_files(paths, header_row, filenames) if paths else ([], [])
+    dfs = []
+    for name, df in zip(filenames, frames):
+        if df is None:
+            continue
+        df = clean_columns(df)
+        df['SourceFile'] = name
+        dfs.append(df)
+    rollups = None
+    if history:
+        # Department and employee roll-ups merge the stored months' partials with the
+        # fresh workbooks'; only new or corrected months are aggregated again
+        import month_aggregates
+        rollups = month_aggregates.rollups(dfs, exclude_sources=filenames)
+        # Only the columns the analysis reads; one frame per stored workbook, like uploads
+        from dataset_store import read_history
+        stored = read_history(HISTORY_ROLES, exclude_sources=filenames)
+        dfs += [part.drop(columns='UploadMonth') for _, part in stored.groupby('SourceFile', sort=False)]
+    if not dfs:
+        return {}, errors
+
+    df = clean_and_label(dfs)
+    schema = resolve_schema(df)
+    df, schema = build_summary(df, schema)
+    df, _ = normalize_dtypes(df)
+
+    features = build_feature_frame(df, schema)
+    months = df['UploadPeriod'] if df['UploadPeriod'].nunique() > 1 else None
+    tables = {
+        'cleaned_attendance_summary': df,
+        'attrition_risk': predict_attrition(df, schema, features, months=months),
+        'department_risk': get_attrition_by_department(df, schema, features),
+        'penalty_forecast': forecast_penalty(df, schema, features),
+    }
+    if months is not None:
+        tables['penalty_trend'] = forecast_penalty_trend(df, schema)
+    if rollups:
+        tables.update({f"{'department' if role == 'dept' else 'employee'}_rollup": table
+                       for role, table in rollups.items()})
+    return tables, errors
+
+
+def write_table(df, path, fmt):
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    if fmt == 'parquet':
+        arrow_compatible(df).to_parquet(path, index=False)
+    elif fmt == 'feather':
+        arrow_compatible(df).to_feather(path)
+    elif fmt == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        if len(df) > EXCEL_MAX_ROWS:
+            raise ValueError(f"{len(df)} rows do not fit in one Excel sheet; use --format parquet")
+        df.to_excel(path, index=False)
+
+
+def write_outputs(tables, out_dir, fmt):
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for name, df in tables.items():
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        write_table(df, path, fmt)
+        written.append((path, len(df)))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the employee analysis over a directory of workbooks.")
+    parser.add_argument('input_dir', nargs='?', help="directory containing the monthly/plant workbooks")
+    parser.add_argument('-o', '--output-dir', default='batch_output')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='parquet')
+    parser.add_argument('--header-row', default='auto', help="header row index, or 'auto' (default)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="parallel workbook parsers (default: INGEST_MAX_WORKERS)")
+    parser.add_argument('--store', action='store_true',
+                        help="also write the parsed workbooks to the local dataset store")
+    parser.add_argument('--history', action='store_true',
+                        help="include the workbooks already in the dataset store (no Excel parsing)")
+    args = parser.parse_args(argv)
+    if args.input_dir is None and not args.history:
+        parser.error("input_dir is required unless --history is given")
+
+    header_row = args.header_row if args.header_row == 'auto' else int(args.header_row)
+    if args.workers is not None:
+        ingest.INGEST_MAX_WORKERS = max(1, args.workers)
+
+    paths = find_workbooks(args.input_dir) if args.input_dir else []
+    if not paths and not args.history:
+        print(f"No workbooks found in {args.input_dir}", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    tables, errors = analyze(paths, header_row, history=args.history)
+    for name, message in errors:
+        print(f"Skipped {name}: {message}", file=sys.stderr)
+    if not tables:
+        print("No workbook could be parsed", file=sys.stderr)
+        return 1
+
+    if args.store:
+        from dataset_store import persist_uploads
+        summary = tables['cleaned_attendance_summary']
+        for source, part in summary.groupby('SourceFile', observed=True):
+            persist_uploads([part], [source])
+
+    for path, rows in write_outputs(tables, args.output_dir, args.format):
+        print(f"{path}: {rows} rows")
+    analyzed = tables['cleaned_attendance_summary']['SourceFile'].nunique()
+    print(f"{analyzed}/{analyzed + len(errors)} workbooks in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
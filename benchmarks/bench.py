@@ -0,0 +1,205 @@
+# benchmarks/bench.py
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the stores the pipeline writes to out of the working tree, and fresh per run, so
+# a cached model or parsed workbook never hides the cost being measured
+_SCRATCH = tempfile.mkdtemp(prefix="bench-")
+for _var, _name in [("MODEL_STORE_DIR", "models"), ("DATASET_STORE_DIR", "dataset"), ("JOBS_DIR", "jobs"),
+                    ("UPLOAD_SPOOL_DIR", "spool"), ("IDENTITY_INDEX_PATH", "identity.json"),
+                    ("SHARED_FRAMES_DIR", "shared_frames")]:
+    os.environ[_var] = os.path.join(_SCRATCH, _name)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import plotly.express as px  # noqa: E402
+import sklearn  # noqa: E402
+from dash import dcc, html, dash_table  # noqa: E402
+from plotly.io.json import to_json_plotly  # noqa: E402
+
+import ingest  # noqa: E402
+import model_store  # noqa: E402
+import prediction  # noqa: E402
+import predict_enhanced  # noqa: E402
+import schema as schema_module  # noqa: E402
+from aggregates import compute_aggregates, dashboard_metrics  # noqa: E402
+from features import add_absent_and_risk, build_feature_frame  # noqa: E402
+from figures import scatter  # noqa: E402
+from preprocess import MONTHS, normalize_dtypes  # noqa: E402
+from schema import resolve_schema  # noqa: E402
+
+from generate import write_workbook  # noqa: E402
+
+# Per-stage timings of the dashboard pipeline on synthetic workbooks:
+#   python benchmarks/bench.py --rows 1000 100000 --repeat 3
+#   python benchmarks/bench.py --compare benchmarks/results/bench-<earlier>.json
+# Each stage is timed on its own; results (min/median/max seconds per stage and size)
+# are written as JSON, and --compare reports stages that got slower.
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_SECONDS = 0.01  # ignore jitter on stages that take a few ms
+
+
+def reset_caches():
+    ingest.clear_cache()
+    schema_module._resolve.cache_clear()
+    with model_store._lock:
+        model_store._models.clear()
+    shutil.rmtree(model_store.MODEL_STORE_DIR, ignore_errors=True)
+
+
+class Timer:
+    def __init__(self):
+        self.stages = {}
+
+    def __call__(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        value = fn(*args, **kwargs)
+        self.stages[stage] = time.perf_counter() - started
+        return value
+
+
+def build_figures(df, schema, agg):
+    name = schema.name
+    specs = [('top_salary', name, schema.salary), ('top_present', name, schema.present),
+             ('top_absent', name, schema.absent), ('dept_salary', schema.dept, schema.salary),
+             ('dept_penalty', schema.dept, schema.penalty), ('top_risk', name, 'RiskScore')]
+    figures = [px.bar(agg[key], x=x, y=y) for key, x, y in specs if key in agg]
+    figures += [px.pie(agg[key], names=column, values='Count')
+                for key, column in [('dept_count', schema.dept), ('skill_count', schema.skill)] if key in agg]
+    figures.append(scatter(df, x=schema.present, y=schema.salary, title="Attendance vs Salary"))
+    figures.append(scatter(df, x=schema.ot, y=schema.salary, title="Overtime vs Salary"))
+    return figures
+
+
+def callback_output(figures, tables):
+    return html.Div([dcc.Graph(figure=fig) for fig in figures] +
+                    [dash_table.DataTable(data=t.to_dict('records'), columns=[{"name": str(c), "id": str(c)}
+                                                                              for c in t.columns], page_size=10)
+                     for t in tables])
+
+
+def run_once(raw):
+    reset_caches()
+    t = Timer()
+    encoded = base64.b64encode(raw)
+
+    raw = t('base64_decode', base64.b64decode, encoded)
+    t('header_detect', ingest.detect_header_row, raw)
+    df = t('excel_parse', pd.read_excel, io.BytesIO(raw))
+    df, _ = t('normalize_dtypes', normalize_dtypes, df)
+    schema = t('column_detect', resolve_schema, df)
+    schema = t('derived_columns', add_absent_and_risk, df, schema)
+    features = t('feature_frame', build_feature_frame, df, schema)
+
+    risky = t('prediction.predict_attrition', prediction.predict_attrition, df, schema, features)
+    dept = t('prediction.attrition_by_department', prediction.get_attrition_by_department, df, schema, features)
+    penalty = t('prediction.forecast_penalty', prediction.forecast_penalty, df, schema, features)
+    monthly = df.assign(UploadMonth=np.asarray([m.capitalize() for m in MONTHS[:6]])[np.arange(len(df)) % 6])
+    t('prediction.forecast_penalty_trend', prediction.forecast_penalty_trend, monthly, schema)
+    reset_caches()
+    t('predict_enhanced.predict_attrition', predict_enhanced.predict_attrition, df, schema, features)
+    t('predict_enhanced.forecast_penalty', predict_enhanced.forecast_penalty, df, schema)
+
+    agg = t('aggregates', compute_aggregates, df, dashboard_metrics(schema, 'RiskScore' in df.columns), schema.name)
+    figures = t('figures', build_figures, df, schema, agg)
+    output = callback_output(figures, [risky, dept, penalty])
+    payload = t('json_serialize', to_json_plotly, output)
+    return t.stages, len(payload)
+
+
+def summarize(samples):
+    return {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples), 'runs': len(samples)}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': cpus, 'pandas': pd.__version__, 'numpy': np.__version__, 'sklearn': sklearn.__version__,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(rows_list, repeat=1, seed=0):
+    results = {}
+    for rows in rows_list:
+        path = write_workbook(rows, seed)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        samples = {}
+        for _ in range(repeat):
+            stages, payload_bytes = run_once(raw)
+            for stage, seconds in stages.items():
+                samples.setdefault(stage, []).append(seconds)
+        results[str(rows)] = {'workbook_bytes': len(raw), 'payload_bytes': payload_bytes,
+                              'stages': {stage: summarize(s) for stage, s in samples.items()}}
+        total = sum(s['median'] for s in results[str(rows)]['stages'].values())
+        print(f"{rows} rows: {total:.2f}s total (median per stage)")
+        for stage, s in results[str(rows)]['stages'].items():
+            print(f"  {stage:40s} {s['median']:9.4f}s")
+    return results
+
+
+def compare(current, baseline, ratio=REGRESSION_RATIO):
+    # [(rows, stage, baseline median, current median)] for stages slower than `ratio`x
+    # and by more than REGRESSION_MIN_SECONDS
+    slower = []
+    for rows, entry in current.items():
+        old_stages = baseline.get(rows, {}).get('stages', {})
+        for stage, s in entry['stages'].items():
+            old = old_stages.get(stage)
+            if old and s['median'] > old['median'] * ratio and s['median'] - old['median'] > REGRESSION_MIN_SECONDS:
+                slower.append((rows, stage, old['median'], s['median']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the dashboard pipeline.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="results file (default: benchmarks/results/bench-<time>.json)")
+    parser.add_argument('--compare', help="earlier results file to check for regressions")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run(args.rows, args.repeat, args.seed)
+    finally:
+        shutil.rmtree(_SCRATCH, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'environment': environment(), 'repeat': args.repeat, 'seed': args.seed, 'results': results},
+                  f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        slower = compare(results, baseline)
+        for rows, stage, old, new in slower:
+            print(f"SLOWER {rows} rows {stage}: {old:.4f}s -> {new:.4f}s ({new / old:.2f}x)")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
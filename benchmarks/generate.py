@@ -0,0 +1,82 @@
+# benchmarks/generate.py
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Synthetic attendance/payroll workbooks with the column conventions schema.py expects
+# (names, plant/department, skill, Total Days, Present Days, OT Hours, salaries,
+# Penalty). A fixed seed always produces the same workbook, so timings are comparable
+# between runs; generated files are cached under DATA_DIR.
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".data")
+
+PLANTS = ['FW', 'PP', 'GF', 'MS', 'WL']
+DEPARTMENTS = ['Assembly', 'Welding', 'Paint Shop', 'Quality', 'Stores', 'Maintenance', 'Press Shop', 'Logistics']
+SKILLS = ['Highly Skilled', 'Skilled', 'Semi-Skilled', 'Unskilled']
+SKILL_BASE_PAY = [24000, 18000, 14000, 11000]
+FIRST_NAMES = ['Ramesh', 'Suresh', 'Sita', 'Anita', 'Rahul', 'Priya', 'Vijay', 'Kavita', 'Arjun', 'Meena',
+               'Ravi', 'Pooja', 'Manoj', 'Sunita', 'Deepak', 'Neha', 'Ajay', 'Geeta', 'Sanjay', 'Rekha']
+LAST_NAMES = ['Kumar', 'Sharma', 'Devi', 'Singh', 'Patel', 'Yadav', 'Gupta', 'Verma', 'Reddy', 'Nair',
+              'Das', 'Joshi', 'Mehta', 'Rao', 'Pillai', 'Chauhan']
+
+
+def make_frame(rows, seed=0, month_days=30):
+    rng = np.random.default_rng(seed)
+    skill = rng.choice(len(SKILLS), rows, p=[0.1, 0.4, 0.3, 0.2])
+    total = np.full(rows, month_days, dtype=np.int64)
+    # Most employees attend most days; a tail of frequent absentees
+    attendance = np.clip(rng.beta(8, 1.5, rows), 0.2, 1.0)
+    present = np.round(total * attendance * 2) / 2
+    ot_hours = np.round(rng.gamma(1.5, 6, rows) * (rng.random(rows) < 0.6))
+    basic = (np.asarray(SKILL_BASE_PAY)[skill] * rng.normal(1, 0.08, rows)).round(-1)
+    bonus = np.where(rng.random(rows) < 0.3, rng.integers(5, 50, rows) * 100, 0)
+    penalty = np.where(attendance < 0.75, rng.integers(1, 30, rows) * 50, 0) + \
+        np.where(rng.random(rows) < 0.05, rng.integers(1, 10, rows) * 100, 0)
+    net = (basic * present / total + ot_hours * basic / total / 8 * 2 + bonus - penalty).round(2)
+
+    first = np.asarray(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), rows)]
+    last = np.asarray(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), rows)]
+    return pd.DataFrame({
+        'SR.NO.': np.arange(1, rows + 1),
+        'EP.NO': [f"PP62{n:08d}" for n in rng.permutation(rows)],
+        'Plant': np.asarray(PLANTS, dtype=object)[rng.integers(0, len(PLANTS), rows)],
+        'Employee Name': first + ' ' + last,
+        'Department': np.asarray(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), rows)],
+        'Skill': np.asarray(SKILLS, dtype=object)[skill],
+        'Total Days': total,
+        'Present Days': present,
+        'OT Hours': ot_hours,
+        'Basic salary': basic,
+        'Bonus': bonus,
+        'Penalty': penalty,
+        'Net Salary': net,
+    })
+
+
+def workbook_path(rows, seed=0):
+    return os.path.join(DATA_DIR, f"attendance_{rows}_s{seed}.xlsx")
+
+
+def write_workbook(rows, seed=0, path=None):
+    # Returns the workbook path, generating it only when it is not cached yet
+    path = path or workbook_path(rows, seed)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.xlsx"
+        make_frame(rows, seed).to_excel(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic attendance workbooks.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    for rows in args.rows:
+        print(write_workbook(rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/import_time.py
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold import time of the entry modules, each measured in a fresh interpreter with
+# `python -X importtime`, plus the heaviest imports under it and the cost of
+# wsgi.warm_up():
+#   python benchmarks/import_time.py -o import_times.json
+MODULES = ['app', 'app_multi', 'app_dual_upload', 'batch', 'wsgi']
+TOP_IMPORTS = 10
+
+
+def import_time(module):
+    # Returns (total seconds, [(cumulative seconds, imported module), ...] heaviest first)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cumulative) / 1e6, depth, name.strip()))
+    # importtime prints children before their parent: the module's direct imports are
+    # the depth-1 lines between the previous top-level line and the module's own line
+    end = max(i for i, (_, depth, name) in enumerate(rows) if depth == 0 and name == module)
+    start = max([i for i, (_, depth, _) in enumerate(rows[:end]) if depth == 0], default=-1) + 1
+    total = rows[end][0]
+    children = [(seconds, name) for seconds, depth, name in rows[start:end] if depth == 1]
+    return total, sorted(children, reverse=True)[:TOP_IMPORTS]
+
+
+def warm_up_time():
+    code = "import time, wsgi; print(wsgi.warm_up())"
+    proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of the entry modules.")
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('-o', '--output', help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0], 'modules': {}}
+    for module in args.modules:
+        total, heaviest = import_time(module)
+        results['modules'][module] = {'seconds': total, 'heaviest': [{'module': n, 'seconds': s} for s, n in heaviest]}
+        print(f"{module:18s} {total:6.3f}s  (" + ", ".join(f"{n} {s:.2f}s" for s, n in heaviest[:4]) + ")")
+    results['warm_up_seconds'] = warm_up_time()
+    print(f"{'wsgi.warm_up()':18s} {results['warm_up_seconds']:6.3f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+# dataset_store.py
+import glob
+import os
+import tempfile
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from ingest import clean_column_names
+from preprocess import arrow_compatible, detect_month_from_filename
+from schema import resolve_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.feather as feather
+    from pyarrow import fs
+except ImportError:  # the dashboards still run without pyarrow, only without the store
+    pa = None
+
+# Local columnar copy of every ingested workbook, so history can be reopened without
+# openpyxl. Files are uncompressed Arrow IPC, partitioned hive-style by UploadMonth and
+# SourceFile:
+#   <DATASET_STORE_DIR>/UploadMonth=Jan/SourceFile=plant_a_jan.xlsx/part-<key>.arrow
+# The key is the upload's content key (set by ingest), so persisting an upload that is
+# already stored costs a stat. Reads memory-map the files and only load the requested
+# columns. Data derived from a partition is kept next to it as _<name>-<key>.* files
+# (see sidecar_path): dataset discovery skips them, and replacing the partition's data
+# file removes them.
+DATASET_STORE_DIR = os.environ.get("DATASET_STORE_DIR",
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dataset_store"))
+PARTITION_COLUMNS = ['UploadMonth', 'SourceFile']
+
+
+def store_available():
+    return pa is not None
+
+
+def _frame_key(df):
+    # Content key for frames that did not come from ingest
+    return f"{int(pd.util.hash_pandas_object(df, index=True).sum()) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def _partition_dir(month, source_file):
+    return os.path.join(DATASET_STORE_DIR, f"UploadMonth={quote(str(month), safe='')}",
+                        f"SourceFile={quote(str(source_file), safe='')}")
+
+
+def _to_table(df):
+    table = pa.Table.from_pandas(arrow_compatible(df), preserve_index=False)
+    # Categoricals are stored as plain strings: whether a column was categorical depends
+    # on each file's cardinality, and the partitions must unify into one schema on read
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+    return table.replace_schema_metadata(None)
+
+
+def write_dataset(df, source_file, month=None):
+    # Writes one workbook's frame as its (month, source) partition and returns the file
+    # path. Re-ingesting identical data is a no-op; a corrected upload for the same
+    # month and source replaces the previous file.
+    if pa is None:
+        raise ImportError("pyarrow is required for the dataset store")
+    if month is None:
+        month = df['UploadMonth'].iloc[0] if 'UploadMonth' in df.columns and len(df) else \
+            detect_month_from_filename(source_file)
+
+    part_dir = _partition_dir(month, source_file)
+    key = df.attrs.get('content_key')
+    if key is not None:
+        path = os.path.join(part_dir, f"part-{key}.arrow")
+        if os.path.exists(path):
+            return path
+    data = df.drop(columns=[c for c in PARTITION_COLUMNS if c in df.columns])
+    data.columns = clean_column_names([str(c) for c in data.columns])
+    if key is None:
+        path = os.path.join(part_dir, f"part-{_frame_key(data)}.arrow")
+        if os.path.exists(path):
+            return path
+
+    # The partition directory only appears once its file is complete: the table is
+    # built and written to a dot-prefixed temp file (skipped by dataset discovery) first
+    table = _to_table(data)
+    os.makedirs(DATASET_STORE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=DATASET_STORE_DIR, prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        feather.write_feather(table, tmp, compression='uncompressed')
+        os.makedirs(part_dir, exist_ok=True)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # The previous data file and everything derived from it
+    for entry in os.scandir(part_dir):
+        if entry.path != path:
+            os.remove(entry.path)
+    return path
+
+
+def partition_key(month, source_file):
+    # Key of the partition's current data file, or None when it is not stored
+    for path in glob.glob(os.path.join(_partition_dir(month, source_file), "part-*.arrow")):
+        return os.path.basename(path)[len("part-"):-len(".arrow")]
+    return None
+
+
+def sidecar_path(month, source_file, name, suffix):
+    # Where to keep data derived from a stored partition (None when it is not stored);
+    # the file name carries the data file's key, so a stale sidecar is never read
+    key = partition_key(month, source_file)
+    if key is None:
+        return None
+    return os.path.join(_partition_dir(month, source_file), f"_{name}-{key}{suffix}")
+
+
+def persist_uploads(frames, filenames):
+    # Best-effort write from the dashboards on ingest: a missing pyarrow or a read-only
+    # disk must never fail the analysis itself
+    if pa is None:
+        return
+    for df, name in zip(frames, filenames):
+        if df is None:
+            continue
+        try:
+            write_dataset(df, name)
+        except (OSError, pa.ArrowException):
+            pass
+
+
+def _open_dataset():
+    local = fs.LocalFileSystem(use_mmap=True)
+    dataset = ds.dataset(DATASET_STORE_DIR, format='ipc', partitioning='hive', filesystem=local)
+    # Workbooks do not all share one column set: read with the union of their schemas
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if not schemas:
+        return None
+    try:
+        unified = pa.unify_schemas(schemas + [dataset.partitioning.schema], promote_options='permissive')
+    except TypeError:  # pyarrow < 14
+        unified = pa.unify_schemas(schemas + [dataset.partitioning.schema])
+    return ds.dataset(DATASET_STORE_DIR, schema=unified, format='ipc', partitioning='hive', filesystem=local)
+
+
+def read_dataset(columns=None, months=None, sources=None):
+    # Reads stored history; `columns` projects (only those columns are read), and
+    # `months` / `sources` prune partitions before any file is opened
+    if pa is None:
+        raise ImportError("pyarrow is required for the dataset store")
+    if not os.path.isdir(DATASET_STORE_DIR):
+        return pd.DataFrame(columns=columns)
+    dataset = _open_dataset()
+    if dataset is None:
+        return pd.DataFrame(columns=columns)
+
+    condition = None
+    if months is not None:
+        condition = ds.field('UploadMonth').isin(list(months))
+    if sources is not None:
+        source_filter = ds.field('SourceFile').isin(list(sources))
+        condition = source_filter if condition is None else condition & source_filter
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def read_history(roles=None, exclude_sources=()):
+    # Stored workbooks as one frame with their SourceFile and UploadMonth (memory-mapped,
+    # no Excel parsing). roles: schema roles the caller analyzes; only the columns they
+    # resolve to are read. exclude_sources: files the caller is loading from a fresh
+    # upload instead.
+    if pa is None:
+        raise ImportError("pyarrow is required for the dataset store")
+    exclude = set(exclude_sources)
+    sources = sorted({source for _, source in list_partitions() if source not in exclude})
+    if not sources:
+        return pd.DataFrame(columns=PARTITION_COLUMNS)
+    columns = None
+    if roles is not None:
+        schema = resolve_columns(stored_columns())
+        columns = list(dict.fromkeys(getattr(schema, role) for role in roles if getattr(schema, role)))
+        columns += PARTITION_COLUMNS
+    return read_dataset(columns, sources=sources)
+
+
+def read_partition(month, source_file, roles=None):
+    # One stored workbook (memory-mapped), or None when it is not stored. roles: only
+    # the columns they resolve to in this workbook's own schema are read.
+    if pa is None:
+        raise ImportError("pyarrow is required for the dataset store")
+    for path in glob.glob(os.path.join(_partition_dir(month, source_file), "part-*.arrow")):
+        try:
+            table = feather.read_table(path, memory_map=True)
+        except (OSError, pa.ArrowException):
+            return None  # replaced while opening
+        if roles is not None:
+            schema = resolve_columns(table.schema.names)
+            table = table.select(list(dict.fromkeys(getattr(schema, role) for role in roles
+                                                    if getattr(schema, role))))
+        return table.to_pandas()
+    return None
+
+
+def stored_columns():
+    # Data columns over all stored workbooks, in their stored order
+    dataset = _open_dataset() if pa is not None and os.path.isdir(DATASET_STORE_DIR) else None
+    if dataset is None:
+        return []
+    return [name for name in dataset.schema.names if name not in PARTITION_COLUMNS]
+
+
+def list_partitions():
+    # [(month, source file), ...] currently in the store
+    partitions = []
+    for month_dir in sorted(glob.glob(os.path.join(DATASET_STORE_DIR, "UploadMonth=*"))):
+        month = unquote(os.path.basename(month_dir).split('=', 1)[1])
+        for source_dir in sorted(glob.glob(os.path.join(month_dir, "SourceFile=*"))):
+            partitions.append((month, unquote(os.path.basename(source_dir).split('=', 1)[1])))
+    return partitions
@@ -0,0 +1,46 @@
+# features.py
+import pandas as pd
+from schema import resolve_schema
+from risk_rules import evaluate
+
+# 🧮 Feature frame shared by the prediction functions. build_feature_frame runs once per
+# dataset on only the columns the models use, and never writes to the caller's
+# DataFrame. Predictors treat it as read-only and build their own result frames from it.
+# Rates, scores and training labels come from the shared rules in risk_rules.py.
+FEATURE_RULES = ['AttendanceRate', 'PenaltyRate', 'PenaltyShare', 'AttritionLabel', 'DeptRiskScore',
+                 'EnhancedAttritionLabel']
+
+
+def _numeric(series):
+    return pd.to_numeric(series, errors='coerce').fillna(0)
+
+
+def add_absent_and_risk(df, schema):
+    # Columns the dashboard visuals add to the uploaded frame; returns the updated schema
+    if schema.absent is None and schema.has('present', 'total_days'):
+        df['Absent'] = df[schema.total_days] - df[schema.present]
+        schema = schema.with_columns(absent='Absent')
+    for name, values in evaluate(df, schema, ['RiskScore']).items():
+        df[name] = values
+    return schema
+
+
+def build_feature_frame(df, schema=None):
+    schema = schema or resolve_schema(df)
+    features = {}
+
+    for col in (schema.name, schema.dept, schema.skill):
+        if col is not None:
+            features[col] = df[col]
+    for col in (schema.salary, schema.present, schema.total_days, schema.penalty, schema.absent):
+        if col is not None:
+            features[col] = _numeric(df[col])
+
+    # Same codes LabelEncoder would assign (sorted unique values)
+    if schema.dept is not None:
+        features['DeptEncoded'] = pd.factorize(df[schema.dept].astype(str), sort=True)[0]
+    if schema.skill is not None:
+        features['SkillEncoded'] = pd.factorize(df[schema.skill].astype(str), sort=True)[0]
+
+    features = pd.DataFrame(features, index=df.index)
+    return features.assign(**evaluate(features, schema, FEATURE_RULES))
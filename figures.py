@@ -0,0 +1,53 @@
+# figures.py
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Point budget for row-level charts. Up to WEBGL_MIN_ROWS rows are drawn as SVG, up to
+# MAX_POINTS as WebGL, and anything larger is binned on the server so the figure JSON
+# stays the same size however many rows the workbook has.
+WEBGL_MIN_ROWS = int(os.environ.get("FIGURE_WEBGL_ROWS", 5000))
+MAX_POINTS = int(os.environ.get("FIGURE_MAX_POINTS", 100000))
+DENSITY_BINS = 100
+
+
+def _numeric(df, col):
+    return pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+
+
+def _centers(edges):
+    return (edges[:-1] + edges[1:]) / 2
+
+
+def density_heatmap(df, x, y, title, bins=DENSITY_BINS):
+    xs, ys = _numeric(df, x), _numeric(df, y)
+    ok = ~(np.isnan(xs) | np.isnan(ys))
+    counts, xedges, yedges = np.histogram2d(xs[ok], ys[ok], bins=bins)
+    # Empty tiles are left blank instead of drawn as zero
+    z = np.where(counts.T > 0, counts.T, np.nan)
+    fig = go.Figure(go.Heatmap(x=_centers(xedges), y=_centers(yedges), z=z,
+                               colorscale='Viridis', colorbar={'title': 'Employees'}))
+    fig.update_layout(title=f"{title} (binned, {int(ok.sum()):,} rows)", xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+def scatter(df, x, y, title, color=None):
+    n = len(df)
+    if n > MAX_POINTS:
+        return density_heatmap(df, x, y, title)
+    return px.scatter(df, x=x, y=y, color=color, title=title,
+                      render_mode='webgl' if n > WEBGL_MIN_ROWS else 'svg')
+
+
+def histogram(df, x, title, nbins=10):
+    if len(df) <= WEBGL_MIN_ROWS:
+        return px.histogram(df, x=x, nbins=nbins, title=title)
+    # Bin on the server and ship only the bar heights
+    values = _numeric(df, x)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=nbins)
+    fig = go.Figure(go.Bar(x=_centers(edges), y=counts, width=np.diff(edges)))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title='count', bargap=0)
+    return fig
@@ -0,0 +1,231 @@
+# identity.py
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+# Employee identity index. Where the workbook has an employee number (EP.NO) it is the
+# identity, keyed as "#<number>". Otherwise names are normalized (case, punctuation,
+# whitespace), and a name not seen before is matched token by token. It may differ from
+# a known name in one token only, and only by a close spelling of a word of four or
+# more letters (TOKEN_MATCH_THRESHOLD, lengths within MAX_LENGTH_DIFF, same first or
+# last letter); an initial never matches a full word. Names that only differ in
+# spacing match as well. Candidates come from an index of every name with one
+# token left out, never from the whole index. A name never takes the ID of another name
+# in the same file or month: two spellings side by side in one sheet are two people.
+# Each identity gets a stable integer EmployeeID, persisted across uploads so the
+# per-employee joins and forecasts can key on an int instead of a string. New names are
+# assigned under an exclusive lock on IDENTITY_INDEX_PATH + ".lock", after reloading the
+# index if another process saved it since, so server workers never hand out the same ID
+# twice or overwrite each other's names.
+IDENTITY_INDEX_PATH = os.environ.get("IDENTITY_INDEX_PATH",
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), ".identity_index.json"))
+TOKEN_MATCH_THRESHOLD = 0.8
+MAX_LENGTH_DIFF = 2
+
+_index = None  # key -> EmployeeID
+_stamp = None  # (inode, mtime, size) of the index file as last loaded or saved
+_next_id = 1
+_variants = defaultdict(list)  # (left-out position, its length, its first/last letter, other tokens) -> keys
+_spaced = defaultdict(list)  # key without spaces -> keys
+_lock = threading.Lock()
+
+
+def normalize_names(names):
+    # Vectorized over the unique values; returns normalized keys aligned with `names`
+    codes, uniques = pd.factorize(pd.Series(names), use_na_sentinel=True)
+    keys = (pd.Series(uniques, dtype=object).astype(str).str.lower()
+            .str.replace(r'[^a-z0-9 ]+', ' ', regex=True)
+            .str.split().str.join(' '))
+    return codes, keys.to_numpy(dtype=object)
+
+
+def number_keys(numbers):
+    # Index keys for employee numbers ('' where there is none); 1234.0 is number 1234
+    text = pd.Series(numbers).reset_index(drop=True).astype('string').str.strip().str.upper()
+    text = text.str.replace(r'\.0+$', '', regex=True)
+    return ('#' + text).where(text.str.len() > 0, '').fillna('').to_numpy(dtype=object)
+
+
+def _signatures(tokens, lengths=None):
+    # Index entries of a name: every token position, left out, with the token's length
+    # and its first or its last letter (a close spelling keeps at least one of them)
+    for i, token in enumerate(tokens):
+        rest = tuple(tokens[:i] + tokens[i + 1:])
+        for length in (lengths(len(token)) if lengths else (len(token),)):
+            yield i, length, '^' + token[0], rest
+            yield i, length, '$' + token[-1], rest
+
+
+def _file_stamp():
+    try:
+        info = os.stat(IDENTITY_INDEX_PATH)
+    except OSError:
+        return None
+    return info.st_ino, info.st_mtime_ns, info.st_size
+
+
+def _add(key, employee_id):
+    _index[key] = employee_id
+    if key.startswith('#'):
+        return
+    for signature in _signatures(key.split()):
+        _variants[signature].append(key)
+    _spaced[key.replace(' ', '')].append(key)
+
+
+def _load(force=False):
+    # Reads the saved index (on first use, or with force when the file has changed)
+    global _index, _next_id, _stamp
+    if _index is not None and not force:
+        return
+    stamp = _file_stamp()
+    if _index is not None and stamp == _stamp:
+        return
+    saved = {}
+    if stamp is not None:
+        try:
+            with open(IDENTITY_INDEX_PATH) as f:
+                saved = {k: int(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            saved = {}
+    _index = {}
+    _variants.clear()
+    _spaced.clear()
+    for key, employee_id in saved.items():
+        _add(key, employee_id)
+    _next_id = max(_next_id, max(saved.values(), default=0) + 1)
+    _stamp = stamp
+
+
+@contextmanager
+def _locked_index():
+    # Exclusive lock across processes; without a writable directory the in-process
+    # lock is all there is
+    try:
+        fd = os.open(IDENTITY_INDEX_PATH + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError:
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        _load(force=True)
+        yield
+    finally:
+        os.close(fd)  # also drops the lock
+
+
+def _save():
+    global _stamp
+    try:
+        directory = os.path.dirname(IDENTITY_INDEX_PATH) or '.'
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(_index, f)
+        os.replace(tmp, IDENTITY_INDEX_PATH)
+        _stamp = _file_stamp()
+    except OSError:
+        pass  # the in-process index still works; IDs just are not persisted
+
+
+def _token_score(token, other):
+    if token == other:
+        return 1.0
+    if min(len(token), len(other)) < 4:
+        return 0.0
+    # Letters in common bound the ratio, and are much cheaper to count
+    common = sum(min(token.count(c), other.count(c)) for c in set(token))
+    if 2 * common < TOKEN_MATCH_THRESHOLD * (len(token) + len(other)):
+        return 0.0
+    ratio = SequenceMatcher(None, token, other).ratio()
+    return ratio if ratio >= TOKEN_MATCH_THRESHOLD else 0.0
+
+
+def _length_window(length):
+    return range(max(1, length - MAX_LENGTH_DIFF), length + MAX_LENGTH_DIFF + 1)
+
+
+def _candidates(key):
+    # Known names that agree with `key` token by token, best first, as (score, name)
+    tokens = key.split()
+    n = len(tokens)
+    scored = {candidate: 1.0 for candidate in _spaced.get(key.replace(' ', ''), ())}
+    for signature in _signatures(tokens, _length_window):
+        i = signature[0]
+        for candidate in _variants.get(signature, ()):
+            if candidate not in scored:
+                scored[candidate] = (n - 1 + _token_score(tokens[i], candidate.split()[i])) / n
+    return sorted(((score, candidate) for candidate, score in scored.items() if score > (n - 1) / n),
+                  key=lambda c: (-c[0], c[1]))
+
+
+def resolve_keys(keys, groups=None):
+    # Normalized keys -> EmployeeIDs, adding new identities to the index. groups[i]:
+    # labels of the files/months keys[i] occurs in; a new name never takes an ID already
+    # used in one of its groups. Known keys never change ID, so they resolve without
+    # touching the file.
+    global _next_id
+    with _lock:
+        _load()
+        if all(key in _index for key in keys):
+            return np.fromiter((_index[key] for key in keys), dtype=np.int64, count=len(keys))
+        with _locked_index():
+            ids = np.empty(len(keys), dtype=np.int64)
+            taken = defaultdict(set)  # group label -> IDs used there
+            new = []
+            for i, key in enumerate(keys):
+                if key in _index:
+                    ids[i] = _index[key]
+                    for group in (groups[i] if groups else ()):
+                        taken[group].add(ids[i])
+                else:
+                    new.append(i)
+            for i in new:
+                key, own = keys[i], (groups[i] if groups else ())
+                employee_id = None
+                if not key.startswith('#'):
+                    for _, candidate in _candidates(key):
+                        if not any(_index[candidate] in taken[group] for group in own):
+                            employee_id = _index[candidate]
+                            break
+                if employee_id is None:
+                    employee_id = _next_id
+                    _next_id += 1
+                _add(key, employee_id)
+                ids[i] = employee_id
+                for group in own:
+                    taken[group].add(employee_id)
+            _save()
+    return ids
+
+
+def assign_employee_ids(names, numbers=None, groups=()):
+    # Stable integer EmployeeID per row (-1 where neither a name nor a number is given).
+    # numbers: employee numbers aligned with `names`; a row that has one is keyed by it.
+    # groups: label arrays aligned with `names` (source file, month); names that share
+    # a label are never merged.
+    codes, keys = normalize_names(names)
+    row_keys = np.append(keys, '')[codes]  # code -1 (missing name) -> ''
+    if numbers is not None:
+        numbered = number_keys(numbers)
+        row_keys = np.where(numbered != '', numbered, row_keys)
+    codes, keys = pd.factorize(row_keys)
+    key_groups = None
+    if groups:
+        key_groups = [set() for _ in keys]
+        for level, labels in enumerate(groups):
+            pairs = pd.DataFrame({'code': codes, 'label': np.asarray(labels, dtype=object)}).drop_duplicates()
+            for code, label in zip(pairs['code'], pairs['label']):
+                key_groups[code].add((level, label))
+    ids = np.full(len(keys), -1, dtype=np.int64)
+    present = keys != ''
+    if present.any():
+        ids[present] = resolve_keys(keys[present], key_groups and [g for g, p in zip(key_groups, present) if p])
+    return pd.Series(ids[codes], index=names.index if isinstance(names, pd.Series) else None, name='EmployeeID')
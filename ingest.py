@@ -0,0 +1,312 @@
+# ingest.py
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import shared_frames
+from preprocess import normalize_dtypes
+from metrics import capture, record_all, stage
+
+# Parsed-workbook cache shared by all three apps. Entries are keyed by a hash of the
+# workbook bytes plus the header row, and evicted least-recently-used once either the
+# entry count or the total in-memory size of the cached frames exceeds its limit.
+# Frames are stored with compacted dtypes (preprocess.normalize_dtypes). Behind it,
+# shared_frames holds every parsed workbook once per host: a worker that misses its own
+# cache attaches to the frame another worker (or the ingest pool) already parsed, and
+# keeps that attachment while the entry stays in its cache.
+CACHE_MAX_ENTRIES = int(os.environ.get("UPLOAD_CACHE_MAX_ENTRIES", 16))
+CACHE_MAX_BYTES = int(os.environ.get("UPLOAD_CACHE_MAX_MB", 512)) * 1024 * 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+# With copy-on-write (pandas >= 3) callers can share the cached columns: writing to
+# their copy copies the touched column first
+_COPY_ON_WRITE = int(pd.__version__.split('.')[0]) >= 3
+
+# Header detection only reads this many raw rows (matches the 0-10 manual selectors)
+# and picks the row with the most keyword hits.
+HEADER_SCAN_ROWS = 11
+HEADER_KEYWORDS = ('name', 'present', 'total', 'penalt')
+_header_rows = OrderedDict()
+
+# Multi-file uploads are parsed in a process pool (Excel parsing is CPU-bound). The
+# pool is created on first use and reused; forkserver avoids forking the threaded
+# web server process.
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", min(4, _cpus)))
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def clean_column_names(columns):
+    # Strip whitespace and number repeated headers: "Bonus", "Bonus_1", ...
+    seen = {}
+    new_cols = []
+    for col in columns:
+        col = col.strip()
+        if col in seen:
+            seen[col] += 1
+            new_cols.append(f"{col}_{seen[col]}")
+        else:
+            seen[col] = 0
+            new_cols.append(col)
+    return new_cols
+
+
+def clean_columns(df):
+    df.columns = clean_column_names(df.columns)
+    return df
+
+
+def _frame_nbytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        _cache.move_to_end(key)
+        return entry[0]
+
+
+def _private(df, key=None):
+    # The caller's copy. `key` (the cache key) is kept as attrs['content_key'], so the
+    # dataset store can key the frame without hashing it again.
+    df = df.copy(deep=not _COPY_ON_WRITE)
+    if key is not None:
+        df.attrs['content_key'] = _shared_key(*key)
+    return df
+
+
+def _shared_key(key, header_row):
+    return f"{key}-h{header_row}"
+
+
+def _cache_put(key, df):
+    # key is (content key, header row). Dropping an entry releases its shared attachment
+    # (a no-op for frames that were never shared).
+    global _cache_bytes
+    nbytes = _frame_nbytes(df)
+    if nbytes > CACHE_MAX_BYTES:
+        shared_frames.release(_shared_key(*key))
+        return
+    dropped = []
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[1]
+            dropped.append(key)
+        _cache[key] = (df, nbytes)
+        _cache_bytes += nbytes
+        while _cache and (len(_cache) > CACHE_MAX_ENTRIES or _cache_bytes > CACHE_MAX_BYTES):
+            evicted_key, (_, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= evicted
+            dropped.append(evicted_key)
+    for dropped_key in dropped:
+        shared_frames.release(_shared_key(*dropped_key))
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+    shared_frames.release_all()
+
+
+def cache_info():
+    with _cache_lock:
+        info = {"entries": len(_cache), "bytes": _cache_bytes,
+                "max_entries": CACHE_MAX_ENTRIES, "max_bytes": CACHE_MAX_BYTES}
+    info["shared"] = shared_frames.registry_info()
+    return info
+
+
+def score_header_row(values):
+    cells = [str(v).lower() for v in values if pd.notna(v)]
+    return sum(any(k in c for c in cells) for k in HEADER_KEYWORDS)
+
+
+def detect_header_row(raw, max_rows=HEADER_SCAN_ROWS):
+    # Cheap read of the first rows only; returns None when no row looks like a header.
+    # raw may also be a path or file object.
+    source = io.BytesIO(raw) if isinstance(raw, (bytes, bytearray)) else raw
+    preview = pd.read_excel(source, header=None, nrows=max_rows)
+    best_row, best_score = None, 0
+    for i, row in enumerate(preview.itertuples(index=False)):
+        score = score_header_row(row)
+        if score > best_score:
+            best_row, best_score = i, score
+    return best_row
+
+
+def _known_header(key):
+    with _cache_lock:
+        if key in _header_rows:
+            _header_rows.move_to_end(key)
+            return True, _header_rows[key]
+    return False, None
+
+
+def _remember_header(key, header_row):
+    with _cache_lock:
+        _header_rows[key] = header_row
+        while len(_header_rows) > CACHE_MAX_ENTRIES * 4:
+            _header_rows.popitem(last=False)
+
+
+def _attach_shared(key, header_row):
+    with stage('shared_attach') as s:
+        df = shared_frames.attach(_shared_key(key, header_row))
+        s.rows = None if df is None else len(df)
+    return df
+
+
+def _publish(key, header_row, df):
+    # Failed publishes are timed under their own stage name, so /metrics counts them
+    # (pool workers included: their stages travel back with the result)
+    with stage('shared_publish', rows=len(df)) as s:
+        published = shared_frames.publish(_shared_key(key, header_row), df)
+        if not published:
+            s.name = 'shared_publish_failed'
+    return published
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _pool = ProcessPoolExecutor(max_workers=INGEST_MAX_WORKERS, mp_context=context)
+        return _pool
+
+
+def _parse_file(path, header_row, key=None):
+    # Runs in a pool worker: resolve 'auto', parse, compact (smaller pickle back). The
+    # workbook is handed to the parser by path, with no in-memory copy. Stage timings
+    # travel back with the frame, since a worker's metrics are never scraped.
+    # With a content `key` the frame goes to shared_frames and None is returned in its
+    # place (nothing to pickle); the parent attaches to it.
+    with capture() as stages:
+        nbytes = os.path.getsize(path)
+        if header_row == 'auto':
+            with stage('header_detect', nbytes=nbytes):
+                header_row = detect_header_row(path)
+        shared = key is not None and shared_frames.enabled()
+        if shared and shared_frames.registered(_shared_key(key, header_row)):
+            return header_row, None, stages
+        df = _parse_excel(path, header_row, nbytes)
+        if shared and _publish(key, header_row, df):
+            df = None
+    return header_row, df, stages
+
+
+def _parse_excel(source, header_row, nbytes=None):
+    with stage('excel_parse', nbytes=nbytes) as s:
+        df = pd.read_excel(source, header=header_row)
+        s.rows = len(df)
+    with stage('normalize_dtypes', rows=len(df)):
+        df, report = normalize_dtypes(df)
+    # Travels with the frame (pool pickle, shared Arrow file), so the apps can report it
+    df.attrs['dtype_saved'] = report['saved']
+    return df
+
+
+def memory_saved(frames):
+    # Bytes normalize_dtypes saved on these frames when they were parsed
+    return sum(df.attrs.get('dtype_saved', 0) for df in frames if df is not None)
+
+
+def _load_many(items, header_row, filenames):
+    # items[i] is (cache key, path), or None for a file that could not be read
+    frames = [None] * len(items)
+    errors = []
+    pending = []
+
+    for i, item in enumerate(items):
+        if item is None:
+            errors.append((filenames[i], "Could not read file"))
+            continue
+        key, path = item
+        known, resolved = _known_header(key) if header_row == 'auto' else (True, header_row)
+        cached = _cache_get((key, resolved)) if known else None
+        if cached is None and known:
+            cached = _attach_shared(key, resolved)
+            if cached is not None:
+                _cache_put((key, resolved), cached)
+        if cached is not None:
+            frames[i] = _private(cached, (key, resolved))
+        else:
+            pending.append((i, key, path))
+
+    results = []
+    if len(pending) == 1 or INGEST_MAX_WORKERS <= 1:
+        # Nothing to overlap: skip the pool round-trip
+        for i, key, path in pending:
+            try:
+                results.append((i, key, path, _parse_file(path, header_row, key)))
+            except Exception as e:
+                errors.append((filenames[i], str(e)))
+    else:
+        pool = _get_pool()
+        futures = [(i, key, path, pool.submit(_parse_file, path, header_row, key))
+                   for i, key, path in pending]
+        for i, key, path, future in futures:
+            try:
+                results.append((i, key, path, future.result()))
+            except Exception as e:
+                errors.append((filenames[i], str(e)))
+
+    for i, key, path, (resolved, df, stages) in results:
+        record_all(stages)
+        if header_row == 'auto':
+            _remember_header(key, resolved)
+        if df is None:
+            df = _attach_shared(key, resolved)
+        if df is None:
+            # Evicted before this process could attach (registry over its size cap)
+            try:
+                df = _parse_file(path, resolved)[1]
+            except Exception as e:
+                errors.append((filenames[i], str(e)))
+                continue
+        _cache_put((key, resolved), df)
+        frames[i] = _private(df, (key, resolved))
+
+    return frames, errors
+
+
+def file_key(path):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_files(paths, header_row=0, filenames=None, keys=None):
+    # Parse several workbooks on disk (spooled uploads, batch runs) at once. Cached files
+    # are served from the cache and the rest fan out to the process pool, one workbook
+    # per task. Returns (frames, errors): frames[i] is None for a file that failed, and
+    # errors lists (filename, message). `keys` are content hashes when the caller has
+    # them; otherwise the files are hashed.
+    filenames = filenames or [os.path.basename(str(p)) for p in paths]
+    items = []
+    for i, path in enumerate(paths):
+        try:
+            key = keys[i] if keys is not None else file_key(path)
+        except OSError:
+            items.append(None)
+            continue
+        items.append((key, os.fspath(path)))
+    return _load_many(items, header_row, filenames)
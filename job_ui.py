@@ -0,0 +1,66 @@
+# job_ui.py
+import os
+
+import dash
+from dash import dcc, html, Input, Output, State
+
+import jobs
+
+# Progress panel shared by the apps: a job-ID store, a poll interval (enabled only
+# while a job runs), a progress bar with the current stage, and a cancel button.
+# Component IDs are prefixed so an app can host more than one panel.
+JOB_POLL_MS = int(os.environ.get("JOB_POLL_MS", 500))
+
+
+def job_panel(prefix):
+    return html.Div([
+        dcc.Store(id=f'{prefix}-job'),
+        dcc.Interval(id=f'{prefix}-poll', interval=JOB_POLL_MS, disabled=True),
+        html.Progress(id=f'{prefix}-progress', value='0', max='1', style={'width': '60%'}),
+        html.Span(id=f'{prefix}-stage', style={'marginLeft': '10px'}),
+        html.Button("✖ Cancel", id=f'{prefix}-cancel', n_clicks=0, style={'marginLeft': '10px'}),
+    ], style={'margin': '10px 0'})
+
+
+def start_outputs(prefix):
+    # Outputs for an app's submit callback: (job ID, poll interval disabled, stage text).
+    # The stage text reports why no job was started, e.g. a failed upload.
+    return [Output(f'{prefix}-job', 'data'), Output(f'{prefix}-poll', 'disabled', allow_duplicate=True),
+            Output(f'{prefix}-stage', 'children', allow_duplicate=True)]
+
+
+def register_job_callbacks(app, prefix, output_id):
+    @app.callback(
+        Output(output_id, 'children'),
+        Output(f'{prefix}-progress', 'value'),
+        Output(f'{prefix}-stage', 'children'),
+        Output(f'{prefix}-poll', 'disabled'),
+        Input(f'{prefix}-poll', 'n_intervals'),
+        State(f'{prefix}-job', 'data'),
+        prevent_initial_call=True
+    )
+    def poll_job(n_intervals, job):
+        info = jobs.status(job) if job else None
+        if info is None:
+            return dash.no_update, '0', "", True
+        state = info['state']
+        progress = str(info.get('progress') or 0)
+        if state in jobs.ACTIVE_STATES:
+            return dash.no_update, progress, f"⏳ {info.get('stage', state)}", False
+        if state == 'done':
+            return jobs.result(job), '1', "", True
+        if state == 'failed':
+            return html.Div([html.H4("❌ Analysis failed"), html.Pre(info.get('error') or "")]), progress, "", True
+        return html.Div(f"⚠️ Analysis {state}"), progress, "", True
+
+    @app.callback(
+        Output(f'{prefix}-stage', 'children', allow_duplicate=True),
+        Input(f'{prefix}-cancel', 'n_clicks'),
+        State(f'{prefix}-job', 'data'),
+        prevent_initial_call=True
+    )
+    def cancel_job(n_clicks, job):
+        if not job:
+            return dash.no_update
+        jobs.cancel(job)
+        return "Cancelling…"
@@ -0,0 +1,188 @@
+# jobs.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+
+from metrics import profile_requested, profiled, stage
+
+# Background analysis jobs. The analyze callbacks submit the work here and return at
+# once; the page polls status() until the job is done. Job state and results live on
+# disk under JOBS_DIR (<id>.json status, <id>.joblib result, <id>.cancel flag), so any
+# server worker can report on a job and no broker is needed. The job ID is a hash of
+# the inputs: submitting identical inputs while a job is queued or running returns
+# the existing job instead of starting another one.
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jobs"))
+JOBS_MAX_WORKERS = int(os.environ.get("JOBS_MAX_WORKERS", 2))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 24 * 3600))
+
+ACTIVE_STATES = ('queued', 'running')
+# Job IDs reach the server from the page (job_ui), so anything else is an unknown job,
+# never a path
+_ID_PATTERN = re.compile(r'^[a-z][a-z0-9_]*-[0-9a-f]{24}$')
+
+_executor = None
+_lock = threading.Lock()
+_cancel_events = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def no_progress(stage, fraction):
+    # Default progress hook when an analysis runs outside a job
+    pass
+
+
+def job_id(kind, *parts):
+    h = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        h.update(repr(part).encode() if not isinstance(part, str) else part.encode())
+        h.update(b'\0')
+    return f"{kind}-{h.hexdigest()}"
+
+
+def _valid(job):
+    return isinstance(job, str) and _ID_PATTERN.match(job) is not None
+
+
+def _path(job, suffix):
+    if not _valid(job):
+        raise ValueError(f"Not a job ID: {job!r}")
+    return os.path.join(JOBS_DIR, f"{job}{suffix}")
+
+
+def _write_status(job, **fields):
+    current = status(job) or {}
+    current.update(fields, id=job, updated=time.time())
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=JOBS_DIR, suffix=".tmp")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(current, f)
+    os.replace(tmp, _path(job, ".json"))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def status(job):
+    # {'state', 'stage', 'progress', 'error', ...} or None for an unknown job. A job
+    # whose worker process died before finishing is reported as 'interrupted'.
+    try:
+        with open(_path(job, ".json")) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if info.get('state') in ACTIVE_STATES and not _pid_alive(info.get('pid', 0)):
+        info['state'] = 'interrupted'
+    return info
+
+
+def result(job):
+    try:
+        with stage('job.result_load'):
+            return joblib.load(_path(job, ".joblib"))
+    except (OSError, EOFError, ValueError):
+        return None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOBS_MAX_WORKERS, thread_name_prefix="analysis-job")
+        return _executor
+
+
+def _purge_expired():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    try:
+        entries = os.scandir(JOBS_DIR)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def _run(job, fn, args, profile=False):
+    event = _cancel_events[job]
+
+    def progress(stage, fraction):
+        if event.is_set() or os.path.exists(_path(job, ".cancel")):
+            raise JobCancelled()
+        _write_status(job, stage=stage, progress=round(fraction, 3))
+
+    try:
+        progress('Starting', 0.0)
+        _write_status(job, state='running', started=time.time())
+        with profiled(job, profile), stage(f"{job.split('-')[0]}.total"):
+            value = fn(*args, progress=progress)
+        with stage('job.result_store'):
+            fd, tmp = tempfile.mkstemp(dir=JOBS_DIR, suffix=".tmp")
+            os.close(fd)
+            joblib.dump(value, tmp)
+            os.replace(tmp, _path(job, ".joblib"))
+        _write_status(job, state='done', stage='Done', progress=1.0, finished=time.time())
+    except JobCancelled:
+        _write_status(job, state='cancelled', stage='Cancelled', finished=time.time())
+    except Exception as e:
+        _write_status(job, state='failed', error=str(e), finished=time.time())
+    finally:
+        with _lock:
+            _cancel_events.pop(job, None)
+
+
+def submit(kind, fn, *args, key=None):
+    # Runs fn(*args, progress=...) in the background and returns the job ID. `key`
+    # (default: args) identifies identical work for de-duplication. The run is
+    # cProfiled when metrics.profile_requested() says so for the submitting request.
+    job = job_id(kind, *(args if key is None else key))
+    with _lock:
+        current = status(job)
+        if job in _cancel_events or (current and current['state'] in ACTIVE_STATES):
+            return job
+        _cancel_events[job] = threading.Event()
+    _purge_expired()
+    for suffix in (".joblib", ".cancel"):
+        if os.path.exists(_path(job, suffix)):
+            os.remove(_path(job, suffix))
+    _write_status(job, state='queued', stage='Queued', progress=0.0, error=None, pid=os.getpid(),
+                  submitted=time.time())
+    _get_executor().submit(_run, job, fn, args, profile_requested())
+    return job
+
+
+def cancel(job):
+    # Cooperative: the job stops at its next progress() call. The flag file reaches
+    # jobs running in another server worker.
+    if not _valid(job):
+        return
+    with _lock:
+        event = _cancel_events.get(job)
+    if event is not None:
+        event.set()
+    current = status(job)
+    if current and current['state'] in ACTIVE_STATES:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        open(_path(job, ".cancel"), 'w').close()
+        if current['state'] == 'queued':
+            _write_status(job, state='cancelled', stage='Cancelled')
@@ -0,0 +1,213 @@
+# metrics.py
+import cProfile
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Hot-path instrumentation for the analysis pipeline. Each stage runs inside
+# `with stage(name) as s:` or between s.start() and s.stop() (callers may set s.rows /
+# s.nbytes). Per-stage duration histograms, row/byte counters and peak memory are
+# exported in Prometheus text format on /metrics (register_metrics).
+# Peak memory per stage comes from tracemalloc, which slows allocation-heavy code, so
+# it is only collected with METRICS_TRACE_MEMORY=1. It is the growth over the memory
+# traced at stage start, and an inner stage resets the peak of the stage around it.
+# cProfile dumps of whole analyses are opt-in: PROFILE_ANALYSES=1 for every run, or a
+# `profile=1` cookie for the requests of one browser.
+METRICS_TRACE_MEMORY = os.environ.get("METRICS_TRACE_MEMORY", "0") == "1"
+PROFILE_ANALYSES = os.environ.get("PROFILE_ANALYSES", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".profiles"))
+METRICS_ROUTE = '/metrics'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_stages = {}
+_requests = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _new_series():
+    return {'count': 0, 'seconds': 0.0, 'buckets': [0] * len(BUCKETS), 'rows': 0, 'bytes': 0,
+            'peak_memory': None, 'max_peak_memory': 0}
+
+
+def _observe(table, key, seconds, rows=None, nbytes=None, peak_memory=None):
+    with _lock:
+        series = table.get(key)
+        if series is None:
+            series = table[key] = _new_series()
+        series['count'] += 1
+        series['seconds'] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                series['buckets'][i] += 1
+        series['rows'] += rows or 0
+        series['bytes'] += nbytes or 0
+        if peak_memory is not None:
+            series['peak_memory'] = peak_memory
+            series['max_peak_memory'] = max(series['max_peak_memory'], peak_memory)
+
+
+class Stage:
+    __slots__ = ('name', 'rows', 'nbytes', 'seconds', 'peak_memory', '_started', '_traced')
+
+    def __init__(self, name, rows=None, nbytes=None):
+        self.name, self.rows, self.nbytes = name, rows, nbytes
+        self.seconds = self.peak_memory = None
+
+    def start(self):
+        if METRICS_TRACE_MEMORY:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._traced = tracemalloc.get_traced_memory()[0]
+        self._started = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._started
+        if METRICS_TRACE_MEMORY and tracemalloc.is_tracing():
+            self.peak_memory = max(tracemalloc.get_traced_memory()[1] - self._traced, 0)
+        record((self.name, self.seconds, self.rows, self.nbytes, self.peak_memory))
+
+    __enter__ = start
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def stage(name, rows=None, nbytes=None):
+    return Stage(name, rows, nbytes)
+
+
+def record(entry):
+    # entry: (stage, seconds, rows, bytes, peak memory). Inside capture() entries are
+    # collected for the caller instead of being recorded here.
+    captured = getattr(_local, 'captured', None)
+    if captured is not None:
+        captured.append(entry)
+    else:
+        _observe(_stages, entry[0], *entry[1:])
+
+
+def record_all(entries):
+    for entry in entries:
+        record(entry)
+
+
+@contextmanager
+def capture():
+    # Collects the stages timed in this thread, e.g. in a process-pool worker whose
+    # own registry is never scraped; the parent passes them to record_all()
+    previous = getattr(_local, 'captured', None)
+    _local.captured = []
+    try:
+        yield _local.captured
+    finally:
+        _local.captured = previous
+
+
+def profile_requested():
+    if PROFILE_ANALYSES:
+        return True
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return False
+    return has_request_context() and request.cookies.get('profile') == '1'
+
+
+@contextmanager
+def profiled(label, enabled=True):
+    # Dumps a cProfile .prof file for the block to PROFILE_DIR (open with pstats or
+    # snakeviz). Profiles only the calling thread.
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is already active in this thread
+        yield None
+        return
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}.prof"))
+        except OSError:
+            pass
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _histogram(lines, metric, label, table, help_text):
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for key, series in sorted(table.items()):
+        tag = f'{label}="{_label(key)}"'
+        for bound, count in zip(BUCKETS, series['buckets']):
+            lines.append(f'{metric}_bucket{{{tag},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{tag},le="+Inf"}} {series["count"]}')
+        lines.append(f'{metric}_sum{{{tag}}} {series["seconds"]:.6f}')
+        lines.append(f'{metric}_count{{{tag}}} {series["count"]}')
+
+
+def render():
+    # Prometheus text exposition format (version 0.0.4)
+    with _lock:
+        stages = {k: dict(v, buckets=list(v['buckets'])) for k, v in _stages.items()}
+        requests = {k: dict(v, buckets=list(v['buckets'])) for k, v in _requests.items()}
+    lines = []
+    _histogram(lines, 'dashboard_stage_seconds', 'stage', stages, "Time spent per analysis stage.")
+    for metric, field, kind, help_text in [
+            ('dashboard_stage_rows_total', 'rows', 'counter', "Rows processed per stage."),
+            ('dashboard_stage_bytes_total', 'bytes', 'counter', "Input bytes processed per stage."),
+            ('dashboard_stage_peak_memory_bytes', 'peak_memory', 'gauge',
+             "Traced peak memory of the latest run of each stage (METRICS_TRACE_MEMORY=1)."),
+            ('dashboard_stage_max_peak_memory_bytes', 'max_peak_memory', 'gauge',
+             "Largest traced peak memory of each stage (METRICS_TRACE_MEMORY=1).")]:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for key, series in sorted(stages.items()):
+            if series[field] is not None:
+                lines.append(f'{metric}{{stage="{_label(key)}"}} {series[field]}')
+    _histogram(lines, 'dashboard_request_seconds', 'endpoint', requests, "HTTP request time, per Dash callback output.")
+    lines.append("# HELP dashboard_process_max_rss_bytes Peak resident set size of this process.")
+    lines.append("# TYPE dashboard_process_max_rss_bytes gauge")
+    lines.append(f"dashboard_process_max_rss_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}")
+    return "\n".join(lines) + "\n"
+
+
+def register_metrics(app):
+    # Adds /metrics and request timing to a Dash app's Flask server (once per server)
+    from flask import Response, g, request
+
+    server = app.server
+    if METRICS_ROUTE in {rule.rule for rule in server.url_map.iter_rules()}:
+        return
+    server.add_url_rule(METRICS_ROUTE, 'metrics',
+                        lambda: Response(render(), mimetype='text/plain; version=0.0.4; charset=utf-8'))
+
+    @server.before_request
+    def _start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @server.after_request
+    def _observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None and request.path != METRICS_ROUTE:
+            # URL rules, not raw paths, keep the label set small (static assets collapse)
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            if request.path.endswith('_dash-update-component'):
+                body = request.get_json(silent=True) or {}
+                endpoint = f"callback:{body.get('output', '?')}"
+            _observe(_requests, endpoint, time.perf_counter() - started)
+        return response
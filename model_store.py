@@ -0,0 +1,144 @@
+# model_store.py
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+
+import joblib
+import pandas as pd
+
+from jobs import JOBS_MAX_WORKERS
+
+# Fitted models are persisted as joblib files named after a fingerprint of the
+# training data and feature schema, and kept warm in a small in-process LRU, so
+# repeat analyses and other workers on the same dataset skip the fit. Files not used
+# for MODEL_TTL_SECONDS are deleted, and the least recently used go first while the
+# store is over MODEL_STORE_MAX_MB (checked after every save).
+MODEL_STORE_DIR = os.environ.get("MODEL_STORE_DIR",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), ".model_store"))
+MODEL_TTL_SECONDS = int(os.environ.get("MODEL_TTL_SECONDS", 7 * 24 * 3600))
+MODEL_STORE_MAX_MB = int(os.environ.get("MODEL_STORE_MAX_MB", 2048))
+# Forest fits run inside the analysis job threads (jobs.JOBS_MAX_WORKERS of them), so by
+# default each gets an equal share of the CPUs instead of all of them (n_jobs=-1)
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+MODEL_N_JOBS = int(os.environ.get("MODEL_N_JOBS", max(1, _cpus // JOBS_MAX_WORKERS)))
+MEMORY_MAX_MODELS = 8
+# Read from package metadata: importing sklearn here would undo its lazy import
+SKLEARN_VERSION = metadata.version("scikit-learn")
+
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def fingerprint(kind, X, y):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{kind}|{SKLEARN_VERSION}|{list(map(str, X.columns))}".encode())
+    h.update(pd.util.hash_pandas_object(X, index=False).values.tobytes())
+    h.update(pd.util.hash_pandas_object(pd.Series(y), index=False).values.tobytes())
+    return f"{kind}-{h.hexdigest()}"
+
+
+def _path(key):
+    return os.path.join(MODEL_STORE_DIR, f"{key}.joblib")
+
+
+def _remember(key, model):
+    with _lock:
+        _models[key] = model
+        _models.move_to_end(key)
+        while len(_models) > MEMORY_MAX_MODELS:
+            _models.popitem(last=False)
+
+
+def load_model(key):
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key]
+    path = _path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        model = joblib.load(path)
+        os.utime(path)  # last use, for _purge_expired
+    except Exception:
+        # Truncated or incompatible file: treat as a miss and let the caller refit
+        return None
+    _remember(key, model)
+    return model
+
+
+def _purge_expired(keep=None):
+    now = time.time()
+    files = []
+    try:
+        entries = os.scandir(MODEL_STORE_DIR)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                info = entry.stat()
+                if now - info.st_mtime > MODEL_TTL_SECONDS and entry.path != keep:
+                    os.remove(entry.path)
+                elif entry.name.endswith(".joblib"):
+                    files.append((info.st_mtime, info.st_size, entry.path))
+            except OSError:
+                pass
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= MODEL_STORE_MAX_MB * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def save_model(key, model):
+    os.makedirs(MODEL_STORE_DIR, exist_ok=True)
+    # Write then rename, so concurrent readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=MODEL_STORE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp)
+        os.replace(tmp, _path(key))
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _remember(key, model)
+    _purge_expired(keep=_path(key))
+
+
+def lineage_key(kind, columns, sources=()):
+    # Stable key for models that are updated in place (e.g. grown month by month): one
+    # lineage per feature schema and set of data sources (source files / plants)
+    sources = sorted(map(str, sources))
+    digest = hashlib.blake2b(f"{kind}|{SKLEARN_VERSION}|{list(map(str, columns))}|{sources}".encode(),
+                             digest_size=16).hexdigest()
+    return f"{kind}-{digest}"
+
+
+def store_model(key, model):
+    try:
+        save_model(key, model)
+    except OSError:
+        # Read-only or full disk: still keep the model warm in this process
+        _remember(key, model)
+
+
+def get_or_fit(kind, X, y, make_model):
+    key = fingerprint(kind, X, y)
+    model = load_model(key)
+    if model is None:
+        model = make_model()
+        model.fit(X, y)
+        store_model(key, model)
+    return model
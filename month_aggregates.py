@@ -0,0 +1,95 @@
+# month_aggregates.py
+import os
+import tempfile
+
+import pandas as pd
+
+from dataset_store import list_partitions, read_partition, sidecar_path, store_available
+from schema import resolve_schema
+
+# Incremental department/employee roll-ups over monthly uploads. Each (UploadMonth,
+# SourceFile) partition of the dataset store keeps its own partial sums, counts and
+# maxima per group in a sidecar file next to its data; reads merge the partials. The
+# sidecar is named after the partition's data file, so a new or corrected month only
+# recomputes its own partials, and refresh cost follows the size of that month rather
+# than the whole history. Partials are keyed by schema role, not column name, so
+# workbooks with different headers roll up together.
+GROUP_ROLES = {'dept': 'Department', 'name': 'EmployeeName'}
+VALUE_ROLES = ('present', 'absent', 'total_days', 'penalty', 'salary', 'ot')
+# Part of the sidecar name: bump it when frame_partials changes, so older partials are
+# recomputed instead of read
+PARTIALS_VERSION = 1
+
+
+def frame_partials(df):
+    # {group role: partials} for one workbook's frame; partials have (stat, value role)
+    # columns and one row per group
+    schema = resolve_schema(df)
+    values = {role: pd.to_numeric(df[getattr(schema, role)], errors='coerce')
+              for role in VALUE_ROLES if getattr(schema, role) is not None}
+    if 'penalty' in values:  # a blank penalty is no penalty, as in features.py
+        values['penalty'] = values['penalty'].fillna(0)
+    if 'absent' not in values and 'present' in values and 'total_days' in values:
+        values['absent'] = values['total_days'] - values['present']
+    values = pd.DataFrame(values, index=df.index)
+    partials = {}
+    for role in GROUP_ROLES:
+        column = getattr(schema, role)
+        if column is None or values.empty:
+            continue
+        grouped = values.groupby(df[column].astype('string').str.strip().rename(role), observed=True)
+        partials[role] = pd.concat({'sum': grouped.sum(), 'count': grouped.count(), 'max': grouped.max()},
+                                   axis=1)
+    return partials
+
+
+def stored_partials(month, source):
+    # Partials of a stored partition, computed from its data on the first read after it
+    # was written; None when the partition is not stored
+    path = sidecar_path(month, source, f'partials{PARTIALS_VERSION}', '.pkl')
+    if path is None:
+        return None
+    try:
+        return pd.read_pickle(path)
+    except (OSError, EOFError, ValueError):
+        pass
+    df = read_partition(month, source, tuple(GROUP_ROLES) + VALUE_ROLES)
+    if df is None:
+        return None
+    partials = frame_partials(df)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            pd.to_pickle(partials, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # recomputed on the next read
+    return partials
+
+
+def _merge(parts, role):
+    stacked = pd.concat(parts)
+    sums = stacked['sum'].groupby(level=0).sum()
+    counts = stacked['count'].groupby(level=0).sum()
+    maxima = stacked['max'].groupby(level=0).max()
+    means = sums / counts.where(counts > 0)
+    merged = pd.concat({'sum': sums, 'count': counts, 'mean': means, 'max': maxima}, axis=1)
+    merged.columns = [f"{value}_{stat}" for stat, value in merged.columns]
+    merged = merged[sorted(merged.columns, key=lambda c: VALUE_ROLES.index(c.rsplit('_', 1)[0]))]
+    return merged.rename_axis(GROUP_ROLES[role]).reset_index()
+
+
+def rollups(frames=(), exclude_sources=(), months=None):
+    # {group role: per-group <value>_sum/_count/_mean/_max} over the stored partitions
+    # (those of `months` when given) plus `frames`, workbooks not in the store yet.
+    # exclude_sources: stored files that `frames` replace.
+    parts = [frame_partials(df) for df in frames]
+    if store_available():
+        exclude = set(exclude_sources)
+        for month, source in list_partitions():
+            if source not in exclude and (months is None or month in months):
+                partials = stored_partials(month, source)
+                if partials is not None:
+                    parts.append(partials)
+    return {role: _merge([p[role] for p in parts if role in p], role)
+            for role in GROUP_ROLES if any(role in p for p in parts)}
@@ -1,71 +1,70 @@
 # predict_enhanced.py
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
+from schema import resolve_schema
+from features import build_feature_frame
+from model_store import get_or_fit, MODEL_N_JOBS
+from prediction import forecast_penalty_trend
 
 # 🔮 Predict top 10 at-risk employees using penalty, attendance, and salary
 
-def predict_attrition(df):
-    df = df.copy()
-
-    required_cols = ['EmployeeName', 'Penalty', 'Present', 'Absent', 'Net Salary']
-    detected_cols = {}
-    for col in df.columns:
-        lower = col.lower()
-        if 'penalt' in lower:
-            detected_cols['Penalty'] = col
-        elif 'present' in lower:
-            detected_cols['Present'] = col
-        elif 'absent' in lower:
-            detected_cols['Absent'] = col
-        elif 'salary' in lower and 'net' in lower:
-            detected_cols['Net Salary'] = col
-        elif 'name' in lower:
-            detected_cols['EmployeeName'] = col
-
-    if len(detected_cols) < 5:
+def predict_attrition(df, schema=None, features=None):
+    schema = schema or resolve_schema(df)
+
+    if not schema.has('name', 'penalty', 'present', 'absent', 'salary'):
         return pd.DataFrame([{"Error": "Missing required columns for prediction"}])
 
-    df = df.rename(columns=detected_cols)
-    df = df.dropna(subset=['Penalty', 'Present', 'Absent', 'Net Salary'])
+    # Select from the shared feature frame instead of copying the caller's DataFrame
+    if features is None:
+        features = build_feature_frame(df, schema)
+    df = features[[schema.name, schema.penalty, schema.present, schema.absent, schema.salary]]
+    df.columns = ['EmployeeName', 'Penalty', 'Present', 'Absent', 'Net Salary']
 
     if df.shape[0] == 0:
         return pd.DataFrame([{"Error": "No valid rows for prediction"}])
 
     X = df[['Penalty', 'Present', 'Absent', 'Net Salary']]
-    y = ((df['Penalty'] > 1000) | (df['Absent'] > 4)).astype(int)  # Simplified assumption
+    y = features['EnhancedAttritionLabel']  # Simplified assumption, see risk_rules.py
 
-    model = RandomForestClassifier()
-    model.fit(X, y)
+    from sklearn.ensemble import RandomForestClassifier  # imported on first use, see prediction.py
+    model = get_or_fit('enhanced-attrition', X, y, lambda: RandomForestClassifier(n_jobs=MODEL_N_JOBS))
 
-    df['AttritionRisk'] = model.predict_proba(X)[:, 1]  # probability of attrition
+    df = df.assign(AttritionRisk=model.predict_proba(X)[:, 1])  # probability of attrition
     top_risk = df.sort_values(by='AttritionRisk', ascending=False).head(10)
 
     return top_risk[['EmployeeName', 'Penalty', 'Present', 'Absent', 'Net Salary', 'AttritionRisk']]
 
 # 🏭 Predict department-level attrition risk
 
-def get_attrition_by_department(df):
-    dept_col = next((c for c in df.columns if 'depart' in c.lower() or 'plant' in c.lower()), None)
-    absent_col = next((c for c in df.columns if 'absent' in c.lower()), None)
-    penalty_col = next((c for c in df.columns if 'penalt' in c.lower()), None)
+def get_attrition_by_department(df, schema=None):
+    schema = schema or resolve_schema(df)
+    dept_col = schema.dept
+    absent_col = schema.absent
+    penalty_col = schema.penalty
 
     if not dept_col or not absent_col or not penalty_col:
         return pd.DataFrame([{"Error": "Missing department/absent/penalty column"}])
 
-    dept_summary = df.groupby(dept_col).agg({absent_col: 'mean', penalty_col: 'mean'}).reset_index()
+    dept_summary = df.groupby(dept_col, observed=True).agg({absent_col: 'mean', penalty_col: 'mean'}).reset_index()
     dept_summary.rename(columns={absent_col: 'Avg Absent', penalty_col: 'Avg Penalty'}, inplace=True)
     return dept_summary
 
-# 📈 Forecast penalties (dummy trend simulation)
-def forecast_penalty(df):
-    name_col = next((c for c in df.columns if 'name' in c.lower()), 'EmployeeName')
-    penalty_col = next((c for c in df.columns if 'penalt' in c.lower()), None)
+# 📈 Forecast penalties: per-employee trend across UploadMonth when several months are
+# loaded, otherwise the 5% trend simulation
+def forecast_penalty(df, schema=None):
+    schema = schema or resolve_schema(df)
+    name_col = schema.name or 'EmployeeName'
+    penalty_col = schema.penalty
 
     if not penalty_col:
         return pd.DataFrame([{"Error": "Penalty column missing"}])
 
-    forecast = df.groupby(name_col)[penalty_col].mean().reset_index()
+    if 'UploadMonth' in df.columns and df['UploadMonth'].nunique() > 1:
+        trend = forecast_penalty_trend(df, schema)
+        forecast = trend[['Employee', 'Average Penalty', 'Predicted Penalty', 'Residual RMSE']]
+        forecast.columns = ['EmployeeName', 'AvgPenalty', 'ExpectedNextPenalty', 'ForecastRMSE']
+        return forecast
+
+    forecast = df.groupby(name_col, observed=True)[penalty_col].mean().reset_index()
     forecast.columns = ['EmployeeName', 'AvgPenalty']
     forecast['ExpectedNextPenalty'] = forecast['AvgPenalty'] * 1.05  # simulate 5% increase
     return forecast
@@ -1,95 +1,226 @@
 # prediction.py
+import copy
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import LabelEncoder
-
-def predict_attrition(df):
-    name_col = next((col for col in df.columns if 'name' in col.lower()), None)
-    dept_col = next((col for col in df.columns if 'depart' in col.lower() or 'plant' in col.lower()), None)
-    salary_col = next((col for col in df.columns if 'net' in col.lower() and 'salary' in col.lower()), None)
-    present_col = next((col for col in df.columns if 'present' in col.lower()), None)
-    total_days_col = next((col for col in df.columns if 'total' in col.lower() and 'day' in col.lower()), None)
-    penalty_col = next((col for col in df.columns if 'penalt' in col.lower()), None)
-    skill_col = next((col for col in df.columns if 'skill' in col.lower()), None)
-
-    required_cols = [dept_col, salary_col, present_col, total_days_col, penalty_col]
-    df[required_cols] = df[required_cols].fillna(0)
-
-    df['AttendanceRate'] = df[present_col] / (df[total_days_col] + 1)
-    df['PenaltyRate'] = df[penalty_col] / (df[salary_col] + 1)
-
-    features = ['AttendanceRate', 'PenaltyRate', salary_col]
-
-    if dept_col:
-        le_dept = LabelEncoder()
-        df['DeptEncoded'] = le_dept.fit_transform(df[dept_col].astype(str))
-        features.append('DeptEncoded')
-
-    if skill_col:
-        le_skill = LabelEncoder()
-        df['SkillEncoded'] = le_skill.fit_transform(df[skill_col].astype(str))
-        features.append('SkillEncoded')
-
-    df['Attrition'] = ((df['AttendanceRate'] < 0.75) & (df['PenaltyRate'] > 0.01)).astype(int)
+from schema import resolve_schema
+from features import build_feature_frame
+from preprocess import period_number
+from model_store import fingerprint, get_or_fit, lineage_key, load_model, store_model, MODEL_N_JOBS
+
+# scikit-learn takes over a second to import, so the estimators are imported on first
+# use rather than at module load; wsgi.warm_up preloads them in a preforking server.
+
+# Incremental mode grows the forest by this many trees per newly seen month
+TREES_PER_MONTH = 25
+
+def attrition_training_set(features, schema):
+    feature_cols = ['AttendanceRate', 'PenaltyRate', schema.salary]
+    if schema.dept:
+        feature_cols.append('DeptEncoded')
+    if schema.skill:
+        feature_cols.append('SkillEncoded')
+
+    X = features[feature_cols]
+    y = features['AttritionLabel']  # risk_rules.py
+
+    valid = X.notna().all(axis=1)
+    return X[valid], y[valid]
+
+def fit_attrition_model(X, y):
+    # Loaded from the model store when this exact training set was fitted before
+    from sklearn.ensemble import RandomForestClassifier
+    return get_or_fit('attrition', X, y,
+                      lambda: RandomForestClassifier(random_state=42, n_jobs=MODEL_N_JOBS))
+
+def update_attrition_model(X, y, months, sources):
+    # Incremental forest for one lineage: the feature columns plus the set of source
+    # files (plants) the rows come from. months labels each row's period (year-qualified
+    # when the file names carry a year). The record maps every covered period to a
+    # fingerprint of its training rows and the number of trees grown from them: a new
+    # period adds TREES_PER_MONTH trees, a period whose rows changed (e.g. the same month
+    # of another year) has its trees replaced, one that is gone has them dropped, and
+    # unchanged periods cost nothing.
+    months, sources = months.loc[X.index], sources.loc[X.index]
+    key = lineage_key('attrition-incremental', X.columns, pd.unique(sources))
+    record = load_model(key) or {'model': None, 'periods': {}}
+
+    current = {}
+    for month in pd.unique(months):
+        mask = (months == month).to_numpy()
+        current[month] = (fingerprint('attrition-period', X[mask], y[mask]), mask)
+    stale = {m for m, entry in record['periods'].items()
+             if m not in current or entry['fingerprint'] != current[m][0]}
+    new_months = [m for m in current if m not in record['periods'] or m in stale]
+    if not new_months and not stale:
+        return record
+
+    # Work on a copy so requests scoring with the cached forest never see it half-grown
+    from sklearn.ensemble import RandomForestClassifier
+    model = copy.deepcopy(record['model'])
+    if model is not None and stale:
+        # Trees are stored in period order, record['periods'][m]['trees'] per period
+        kept = [m not in stale for m, entry in record['periods'].items() for _ in range(entry['trees'])]
+        model.estimators_ = [tree for tree, keep in zip(model.estimators_, kept) if keep]
+        model.n_estimators = len(model.estimators_)
+    periods = {m: entry for m, entry in record['periods'].items() if m not in stale}
+    for month in new_months:
+        month_fingerprint, mask = current[month]
+        X_month, y_month = X[mask], y[mask]
+        trees = 0
+        # Trees fitted on a single class would disagree with the forest's class set
+        if y_month.nunique() == 2:
+            if model is None or not model.estimators_:
+                model = RandomForestClassifier(n_estimators=TREES_PER_MONTH, warm_start=True,
+                                               random_state=42, n_jobs=MODEL_N_JOBS)
+            else:
+                model.n_estimators += TREES_PER_MONTH
+            model.fit(X_month, y_month)
+            trees = TREES_PER_MONTH
+        periods[month] = {'fingerprint': month_fingerprint, 'trees': trees}
+
+    if model is not None and not model.estimators_:
+        model = None
+    record = {'model': model, 'periods': periods}
+    store_model(key, record)
+    return record
+
+def score_attrition(model, X):
+    return model.predict(X)
+
+def predict_attrition(df, schema=None, features=None, months=None, sources=None):
+    # months / sources: per-row period labels and source files (default: the frame's
+    # SourceFile column). With both, the incrementally grown forest of that lineage is
+    # used; otherwise the model is fitted (or loaded) for this exact training set.
+    schema = schema or resolve_schema(df)
+    name_col = schema.name
+    dept_col = schema.dept
+    salary_col = schema.salary
+    present_col = schema.present
+    total_days_col = schema.total_days
+    penalty_col = schema.penalty
+
+    if not all([salary_col, present_col, total_days_col, penalty_col]):
+        return pd.DataFrame(columns=["No data available for prediction"])
 
-    df = df.dropna(subset=features + ['Attrition'])
+    if features is None:
+        features = build_feature_frame(df, schema)
+    X, y = attrition_training_set(features, schema)
 
-    if df.empty:
+    if X.empty:
         return pd.DataFrame(columns=["No data available for prediction"])
 
-    X = df[features]
-    y = df['Attrition']
-    model = RandomForestClassifier(random_state=42)
-    model.fit(X, y)
-    df['Attrition_Risk'] = model.predict(X)
-
-    output_cols = [name_col, dept_col, salary_col, present_col, total_days_col, penalty_col,
-                   'AttendanceRate', 'PenaltyRate']
-    risky_df = df[df['Attrition_Risk'] == 1]
-    risky_employees = risky_df[output_cols].sort_values(by='PenaltyRate', ascending=False).head(10)
+    if sources is None and 'SourceFile' in df.columns:
+        sources = df['SourceFile']
+    model = None
+    if months is not None and sources is not None:
+        model = update_attrition_model(X, y, pd.Series(np.asarray(months), index=df.index),
+                                       pd.Series(np.asarray(sources), index=df.index))['model']
+    if model is None:
+        model = fit_attrition_model(X, y)
+    attrition_risk = score_attrition(model, X)
+
+    output_cols = [c for c in [name_col, dept_col, salary_col, present_col, total_days_col, penalty_col]
+                   if c is not None] + ['AttendanceRate', 'PenaltyRate']
+    risky_df = features.loc[X.index[attrition_risk == 1], output_cols]
+    risky_employees = risky_df.sort_values(by='PenaltyRate', ascending=False).head(10)
 
     return risky_employees
 
-def get_attrition_by_department(df):
-    dept_col = next((col for col in df.columns if 'depart' in col.lower() or 'plant' in col.lower()), None)
-    present_col = next((col for col in df.columns if 'present' in col.lower()), None)
-    total_days_col = next((col for col in df.columns if 'total' in col.lower() and 'day' in col.lower()), None)
-    penalty_col = next((col for col in df.columns if 'penalt' in col.lower()), None)
+def get_attrition_by_department(df, schema=None, features=None):
+    schema = schema or resolve_schema(df)
+    dept_col = schema.dept
 
-    if not all([dept_col, present_col, total_days_col, penalty_col]):
+    if not schema.has('dept', 'present', 'total_days', 'penalty'):
         return pd.DataFrame(columns=["Department", "Attrition Risk Score"])
 
-    df[[present_col, total_days_col, penalty_col]] = df[[present_col, total_days_col, penalty_col]].fillna(0)
+    if features is None:
+        features = build_feature_frame(df, schema)
 
-    df['AttendanceRate'] = df[present_col] / (df[total_days_col] + 1)
-    df['PenaltyRate'] = df[penalty_col] / (df[penalty_col].max() + 1)
-    df['RiskScore'] = (1 - df['AttendanceRate']) + df['PenaltyRate']
+    risk_score = features['DeptRiskScore']  # risk_rules.py
 
-    dept_risk = df.groupby(dept_col)['RiskScore'].mean().reset_index()
+    dept_risk = risk_score.groupby(features[dept_col], observed=True).mean().reset_index()
     dept_risk.columns = ["Department", "Attrition Risk Score"]
     return dept_risk.sort_values(by="Attrition Risk Score", ascending=False)
 
-def forecast_penalty(df):
-    name_col = next((col for col in df.columns if 'name' in col.lower()), None)
-    penalty_col = next((col for col in df.columns if 'penalt' in col.lower()), None)
-    present_col = next((col for col in df.columns if 'present' in col.lower()), None)
-    total_days_col = next((col for col in df.columns if 'total' in col.lower() and 'day' in col.lower()), None)
+def forecast_penalty(df, schema=None, features=None):
+    schema = schema or resolve_schema(df)
+    name_col = schema.name
+    penalty_col = schema.penalty
 
-    if not all([name_col, penalty_col, present_col, total_days_col]):
+    if not schema.has('name', 'penalty', 'present', 'total_days'):
         return pd.DataFrame(columns=["Employee", "Predicted Penalty"])
 
-    df[[penalty_col, present_col, total_days_col]] = df[[penalty_col, present_col, total_days_col]].fillna(0)
+    if features is None:
+        features = build_feature_frame(df, schema)
 
-    df['AttendanceRate'] = df[present_col] / (df[total_days_col] + 1)
-    features = df[['AttendanceRate']]
-    target = df[penalty_col]
+    X = features[['AttendanceRate']]
+    target = features[penalty_col]
 
+    from sklearn.linear_model import LinearRegression
     model = LinearRegression()
-    model.fit(features, target)
-    df['PredictedPenalty'] = model.predict(features)
+    model.fit(X, target)
 
-    result = df[[name_col, penalty_col, 'PredictedPenalty']].copy()
-    result.columns = ["Employee", "Current Penalty", "Predicted Penalty"]
+    result = pd.DataFrame({"Employee": features[name_col],
+                           "Current Penalty": target,
+                           "Predicted Penalty": model.predict(X)})
     return result.sort_values(by="Predicted Penalty", ascending=False).head(10)
 
+def forecast_penalty_trend(df, schema=None, month_col=None):
+    # Per-employee least-squares trend of penalty over the month series, solved for all
+    # employees at once from grouped sums (no per-employee model fits). Returns the
+    # next-month forecast and the RMSE of each employee's fit. Employees are keyed by
+    # EmployeeID when the frame has one (see identity.py), else by name. Months are
+    # ordered chronologically (preprocess.period_number; UploadPeriod carries the year
+    # when the file names do), and a blank penalty counts as zero, as in the features.
+    schema = schema or resolve_schema(df)
+    if month_col is None:
+        month_col = 'UploadPeriod' if 'UploadPeriod' in df.columns else 'UploadMonth'
+    name_col = schema.name
+    penalty_col = schema.penalty
+
+    columns = ["Employee", "Months", "Average Penalty", "Trend", "Predicted Penalty", "Residual RMSE"]
+    if not schema.has('name', 'penalty') or month_col not in df.columns:
+        return pd.DataFrame(columns=columns)
+
+    t = period_number(df[month_col])
+    y = pd.to_numeric(df[penalty_col], errors='coerce').fillna(0).to_numpy(dtype=float)
+    if 'EmployeeID' in df.columns:
+        ids = df['EmployeeID']
+        codes = pd.factorize(ids.where(ids >= 0))[0]
+        # Display each ID under the first name it appeared with
+        rows = np.flatnonzero(codes >= 0)
+        first = rows[np.unique(codes[rows], return_index=True)[1]]
+        employees = df[name_col].to_numpy()[first]
+    else:
+        codes, employees = pd.factorize(df[name_col])
+    valid = (codes >= 0) & ~np.isnan(t)
+    codes, t, y = codes[valid], t[valid], y[valid]
+
+    k = len(employees)
+    n = np.bincount(codes, minlength=k).astype(float)
+    if not n.any():
+        return pd.DataFrame(columns=columns)
+    sum_t = np.bincount(codes, weights=t, minlength=k)
+    sum_y = np.bincount(codes, weights=y, minlength=k)
+    sum_tt = np.bincount(codes, weights=t * t, minlength=k)
+    sum_ty = np.bincount(codes, weights=t * y, minlength=k)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = n * sum_tt - sum_t ** 2
+        # A single distinct month has no slope: the forecast is the employee's mean
+        slope = np.where(denom > 0, (n * sum_ty - sum_t * sum_y) / np.where(denom > 0, denom, 1), 0.0)
+        intercept = (sum_y - slope * sum_t) / n
+        residual = y - (intercept[codes] + slope[codes] * t)
+        rmse = np.sqrt(np.bincount(codes, weights=residual ** 2, minlength=k) / n)
+        mean_y = sum_y / n
+
+        last_t = np.full(k, -np.inf)
+        np.maximum.at(last_t, codes, t)
+        # Penalties are never negative, so a falling trend bottoms out at zero
+        predicted = np.maximum(intercept + slope * (last_t + 1), 0)
+
+    seen = n > 0
+    result = pd.DataFrame({"Employee": employees[seen], "Months": n[seen].astype(int),
+                           "Average Penalty": mean_y[seen], "Trend": slope[seen],
+                           "Predicted Penalty": predicted[seen], "Residual RMSE": rmse[seen]})
+    return result.sort_values(by="Predicted Penalty", ascending=False)
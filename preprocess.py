@@ -1,25 +1,142 @@
 # preprocess.py
+import re
+import numpy as np
 import pandas as pd
+from schema import resolve_schema
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun",
+          "jul", "aug", "sep", "oct", "nov", "dec"]
 
 def detect_month_from_filename(filename):
     filename = filename.lower()
-    for month in ["jan", "feb", "mar", "apr", "may", "jun",
-                  "jul", "aug", "sep", "oct", "nov", "dec"]:
+    for month in MONTHS:
         if month in filename:
             return month.capitalize()
     return "Unknown"
 
+_YEAR = re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)')
+
+def detect_period_from_filename(filename):
+    # Year-qualified month ("Jan 2024") when the file name carries a year, else the
+    # bare month, so the same month of two years never looks like one period
+    month = detect_month_from_filename(filename)
+    year = _YEAR.search(filename)
+    return f"{month} {year.group()}" if year and month != "Unknown" else month
+
+def _month_index(label):
+    key = str(label)[:3].lower()
+    return MONTHS.index(key) if key in MONTHS else np.nan
+
+def _circular_order(months):
+    # Bare month indexes -> 0-based positions within one year, starting after the
+    # widest gap between the months present (ties keep the calendar order)
+    present = np.unique(months[~np.isnan(months)]).astype(int)
+    if not len(present):
+        return months
+    gaps = (present - np.roll(present, 1)) % 12
+    gaps[gaps == 0] = 12  # a single month
+    start = present[np.argmax(gaps)]
+    return (months - start) % 12
+
+def period_number(labels):
+    # Period labels ("Jan", "Jan 2024") -> chronological month ordinals (NaN for
+    # "Unknown"); numeric labels (e.g. a running month index) pass through. When every
+    # label carries a year it is year * 12 + month. Bare months are taken to span at
+    # most a year, with the year boundary in the widest gap between them, so uploads
+    # for Nov, Dec and Jan come out as 0, 1, 2. Labels are parsed once per unique value.
+    labels = pd.Series(labels)
+    if pd.api.types.is_numeric_dtype(labels):
+        return labels.to_numpy(dtype=float)
+    codes, uniques = pd.factorize(labels)
+    months = np.array([_month_index(u) for u in uniques], dtype=float)
+    years = [_YEAR.search(str(u)) for u in uniques]
+    known = ~np.isnan(months)
+    if known.any() and all(year for year, k in zip(years, known) if k):
+        ordinals = np.array([int(year.group()) * 12 if year else 0 for year in years]) + months
+    else:
+        ordinals = _circular_order(months)
+    return np.append(ordinals, np.nan)[codes]
+
 def clean_and_label(dfs: list):
     all_data = []
     for df in dfs:
         source = df['SourceFile'].iloc[0]
         month = detect_month_from_filename(source)
         df['UploadMonth'] = month
+        df['UploadPeriod'] = detect_period_from_filename(source)
 
-        name_col = next((c for c in df.columns if 'name' in c.lower()), None)
+        name_col = resolve_schema(df).name
         if name_col:
             df.rename(columns={name_col: 'EmployeeName'}, inplace=True)
 
         all_data.append(df)
 
     return pd.concat(all_data, ignore_index=True)
+
+# Compact dtypes for cached/combined frames. Low-cardinality text becomes categorical
+# (only columns holding nothing but strings: Excel columns that mix numbers and text,
+# such as account or IFSC codes, stay object so every value keeps its type), whole-
+# number columns become the smallest int type that still leaves headroom for the +1/-
+# arithmetic done downstream, and other floats become float32 only when every value
+# round-trips exactly.
+CATEGORY_MAX_RATIO = 0.5
+INT_TYPES = [np.int8, np.int16, np.int32]
+
+def _compact_int(values):
+    lo, hi = values.min(), values.max()
+    for int_type in INT_TYPES:
+        info = np.iinfo(int_type)
+        if lo >= info.min // 2 and hi <= info.max // 2:
+            return int_type
+    return None
+
+def _compact_dtype(s):
+    if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(s):
+        return None
+    if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+        if pd.api.types.infer_dtype(s, skipna=True) != 'string':
+            return None
+        if s.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(s):
+            return 'category'
+        return None
+    if pd.api.types.is_integer_dtype(s):
+        return _compact_int(s) if len(s) else None
+    if pd.api.types.is_float_dtype(s) and s.dtype != np.float32:
+        values = s.to_numpy()
+        finite = values[~np.isnan(values)]
+        if not len(finite):
+            return None
+        if len(finite) == len(values) and (finite % 1 == 0).all():
+            return _compact_int(finite)
+        if (finite.astype(np.float32) == finite).all():
+            return np.float32
+    return None
+
+def normalize_dtypes(df):
+    # Returns (compacted frame, report) where report has bytes before/after and the
+    # per-column dtype changes
+    before = int(df.memory_usage(index=True, deep=True).sum())
+    changes = {}
+    casts = {}
+    for col in df.columns:
+        new_dtype = _compact_dtype(df[col])
+        if new_dtype is not None:
+            casts[col] = new_dtype
+            changes[col] = (str(df[col].dtype), str(np.dtype(new_dtype)) if new_dtype != 'category' else 'category')
+    if casts:
+        df = df.astype(casts)
+    after = int(df.memory_usage(index=True, deep=True).sum())
+    return df, {'before': before, 'after': after, 'saved': before - after, 'columns': changes}
+
+# Arrow (dataset store, shared frames, batch output) needs one type per column: object
+# columns, or categories, that mix numbers and text are written as text
+_MIXED_TYPES = ('mixed', 'mixed-integer')
+
+def arrow_compatible(df):
+    mixed = {}
+    for col in df.columns:
+        s = df[col]
+        values = s.cat.categories if isinstance(s.dtype, pd.CategoricalDtype) else s
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in _MIXED_TYPES:
+            mixed[col] = s.astype(object).map(str, na_action='ignore')
+    return df.assign(**mixed) if mixed else df
@@ -0,0 +1,187 @@
+# risk_rules.py
+import ast
+import json
+import os
+from dataclasses import fields
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from schema import ColumnSchema
+
+# Declarative risk scoring shared by every app. Each rule is a vectorized expression over
+# the resolved columns: schema roles (absent, penalty, salary, present, total_days, ...)
+# or the output of another rule. Rule kinds:
+# - formula:   numeric expression, e.g. "(absent + penalty) / (salary + 1)"
+# - condition: boolean expression, e.g. "penalty > 1000 or absent > 4" -> 0/1 labels
+# - bands:     labels by threshold on `value` (searchsorted); a value equal to a threshold
+#              falls in the upper band, a missing one in the lowest
+# - cases:     first matching [condition, label] pair wins (np.select), else `default`
+# Expressions compile once to numpy code; evaluate() runs each rule as one array operation.
+# RISK_RULES_PATH may name a JSON file whose entries override (per key) or add rules, so
+# thresholds can be tuned without code changes.
+RISK_RULES_PATH = os.environ.get("RISK_RULES_PATH")
+
+DEFAULT_RULES = {
+    # app.py: dashboard risk score
+    'RiskScore': {'formula': "(absent + penalty) / (salary + 1)"},
+    # app_multi.py: absence bands
+    'AbsentRatio': {'formula': "absent / total_days"},
+    'Risk Status': {'bands': {'value': "AbsentRatio", 'thresholds': [0.15, 0.3],
+                              'labels': ['Low Risk', 'Medium', 'High Risk']}},
+    # prediction.py: training labels and department score
+    'AttendanceRate': {'formula': "present / (total_days + 1)"},
+    'PenaltyRate': {'formula': "penalty / (salary + 1)"},  # relative to the employee's own salary
+    'PenaltyShare': {'formula': "penalty / (max(penalty) + 1)"},  # relative to the largest penalty
+    'AttritionLabel': {'condition': "AttendanceRate < 0.75 and PenaltyRate > 0.01"},
+    'DeptRiskScore': {'formula': "(1 - AttendanceRate) + PenaltyShare"},
+    # predict_enhanced.py: training labels
+    'EnhancedAttritionLabel': {'condition': "penalty > 1000 or absent > 4"},
+}
+
+
+def _reduction(fn):
+    # NaN for an empty frame instead of numpy's zero-size error
+    return lambda values: fn(values) if np.size(values) else np.nan
+
+
+ROLES = tuple(f.name for f in fields(ColumnSchema))
+FUNCTIONS = {'max': _reduction(np.nanmax), 'min': _reduction(np.nanmin), 'mean': _reduction(np.nanmean),
+             'abs': np.abs, 'where': np.where, 'clip': np.clip}
+_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub, ast.UAdd,
+              ast.Not, ast.And, ast.Or, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+
+
+def _load_rules():
+    rules = {name: dict(spec) for name, spec in DEFAULT_RULES.items()}
+    if RISK_RULES_PATH:
+        with open(RISK_RULES_PATH) as f:
+            for name, spec in json.load(f).items():
+                rules[name] = {**rules.get(name, {}), **spec}
+    return rules
+
+
+RULES = _load_rules()
+
+
+class _Vectorize(ast.NodeTransformer):
+    # `and`/`or`/`not` and chained comparisons become element-wise numpy calls
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        func = '_and' if isinstance(node.op, ast.And) else '_or'
+        return ast.Call(ast.Name(func, ast.Load()), node.values, [])
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.Call(ast.Name('_not', ast.Load()), [node.operand], [])
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        operands = [node.left] + node.comparators
+        pairs = [ast.Compare(left, [op], [right]) for left, op, right in zip(operands, node.ops, operands[1:])]
+        return ast.Call(ast.Name('_and', ast.Load()), pairs, [])
+
+
+@lru_cache(maxsize=256)
+def compile_expression(text):
+    # Returns (code, referenced names). Only arithmetic, comparisons, boolean operators,
+    # numbers, names and FUNCTIONS calls are accepted.
+    tree = ast.parse(text, mode='eval')
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError(f"Unsupported call in risk rule: {text!r}")
+        elif isinstance(node, ast.Name):
+            if node.id not in FUNCTIONS:
+                names.add(node.id)
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                raise ValueError(f"Unsupported constant {node.value!r} in risk rule: {text!r}")
+        elif not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+                                   ast.Load) + _OPERATORS):
+            raise ValueError(f"Unsupported syntax in risk rule: {text!r}")
+    tree = ast.fix_missing_locations(_Vectorize().visit(tree))
+    return compile(tree, f"<risk rule {text!r}>", 'eval'), frozenset(names)
+
+
+def _expressions(spec):
+    if 'formula' in spec:
+        return [spec['formula']]
+    if 'condition' in spec:
+        return [spec['condition']]
+    if 'bands' in spec:
+        return [spec['bands']['value']]
+    if 'cases' in spec:
+        return [condition for condition, _ in spec['cases']]
+    raise ValueError(f"Risk rule needs one of formula/condition/bands/cases: {spec!r}")
+
+
+def _dependencies(spec):
+    return frozenset().union(*(compile_expression(text)[1] for text in _expressions(spec)))
+
+
+_NAMESPACE = {'__builtins__': {}, '_and': lambda *a: np.logical_and.reduce(a),
+              '_or': lambda *a: np.logical_or.reduce(a), '_not': np.logical_not, **FUNCTIONS}
+
+
+def _run(text, values, n):
+    result = eval(compile_expression(text)[0], _NAMESPACE, values)
+    return np.full(n, result) if np.ndim(result) == 0 else result
+
+
+def _labels(spec, values, n):
+    if 'formula' in spec:
+        return _run(spec['formula'], values, n).astype(np.float64, copy=False)
+    if 'condition' in spec:
+        return _run(spec['condition'], values, n).astype(np.int64)
+    if 'bands' in spec:
+        bands = spec['bands']
+        value = _run(bands['value'], values, n)
+        codes = np.searchsorted(np.asarray(bands['thresholds'], dtype=np.float64), value, side='right')
+        codes[np.isnan(value)] = 0
+        return pd.Categorical.from_codes(codes, categories=list(bands['labels']))
+    labels = list(dict.fromkeys([label for _, label in spec['cases']] + [spec.get('default', 'Other')]))
+    conditions = [_run(condition, values, n).astype(bool) for condition, _ in spec['cases']]
+    codes = np.select(conditions, [labels.index(label) for _, label in spec['cases']],
+                      default=labels.index(spec.get('default', 'Other')))
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def evaluate(frame, schema, names, rules=None):
+    # {rule name: array of len(frame)} for the requested rules whose inputs the schema
+    # provides; others are left out. Each rule (and each dependency) is computed once.
+    rules = RULES if rules is None else rules
+    n = len(frame)
+    values = {}
+    missing = set()
+    visiting = set()
+
+    def resolve(name):
+        if name in values or name in missing:
+            return name in values
+        if name in rules:
+            if name in visiting:
+                raise ValueError(f"Risk rule {name!r} depends on itself")
+            visiting.add(name)
+            if all(resolve(dep) for dep in _dependencies(rules[name])):
+                values[name] = _labels(rules[name], values, n)
+                return True
+        elif name in ROLES:
+            column = getattr(schema, name)
+            if column is not None and column in frame.columns:
+                values[name] = pd.to_numeric(frame[column], errors='coerce').to_numpy(
+                    dtype=np.float64, na_value=np.nan)
+                return True
+        else:
+            raise ValueError(f"Unknown name in risk rules: {name!r}")
+        missing.add(name)
+        return False
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {name: values[name] for name in names if resolve(name)}
@@ -0,0 +1,67 @@
+# schema.py
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Optional
+
+# One precompiled pattern per column role. The first column whose lower-cased header
+# matches wins, so the mapping only depends on the header tuple. Overtime needs a word
+# boundary: a plain 'ot' substring test also matches "Total Days".
+COLUMN_PATTERNS = {
+    'name': r'name',
+    'dept': r'depart|plant',
+    'salary': r'net.*salary|salary.*net',
+    'basic_salary': r'basic.*salary',
+    'present': r'present',
+    'absent': r'absent',
+    'total_days': r'total.*day',
+    'penalty': r'penalt',
+    'skill': r'skill',
+    'ot': r'\bot\b|overtime',
+    'bonus': r'bonus',
+    'emp_no': r'^(ep|emp|employee)\W*(no|code|id|number)\b',
+}
+_MATCHERS = {role: re.compile(pattern) for role, pattern in COLUMN_PATTERNS.items()}
+# Roles that hold numbers (day counts, money, hours)
+NUMERIC_ROLES = ('salary', 'basic_salary', 'present', 'absent', 'total_days', 'penalty', 'ot', 'bonus')
+
+
+@dataclass(frozen=True)
+class ColumnSchema:
+    name: Optional[str] = None
+    dept: Optional[str] = None
+    salary: Optional[str] = None
+    basic_salary: Optional[str] = None
+    present: Optional[str] = None
+    absent: Optional[str] = None
+    total_days: Optional[str] = None
+    penalty: Optional[str] = None
+    skill: Optional[str] = None
+    ot: Optional[str] = None
+    bonus: Optional[str] = None
+    emp_no: Optional[str] = None
+
+    def has(self, *roles):
+        return all(getattr(self, role) is not None for role in roles)
+
+    def with_columns(self, **columns):
+        return replace(self, **columns)
+
+
+@lru_cache(maxsize=256)
+def _resolve(columns):
+    found = {}
+    for col in columns:
+        lower = str(col).lower()
+        for role, matcher in _MATCHERS.items():
+            if role not in found and matcher.search(lower):
+                found[role] = col
+    return ColumnSchema(**found)
+
+
+def resolve_columns(columns):
+    return _resolve(tuple(columns))
+
+
+def resolve_schema(df):
+    return _resolve(tuple(df.columns))
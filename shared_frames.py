@@ -0,0 +1,211 @@
+# shared_frames.py
+import fcntl
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+from preprocess import arrow_compatible
+
+try:
+    import pyarrow as pa
+except ImportError:  # without pyarrow every worker keeps its own parsed copy
+    pa = None
+
+# Host-wide registry of parsed, normalized workbooks, shared by all server workers (and
+# the ingest pool). A frame is written once as an uncompressed Arrow IPC file named by
+# its content key under SHARED_FRAMES_DIR (tmpfs /dev/shm when available); any process
+# attaches by memory-mapping it, so numeric and string columns are read from the shared
+# pages instead of being parsed and held again per worker.
+# References: an attached process holds a shared flock on the file, counted per key
+# within the process (release() drops one). The mapping shares the lock, so it lasts
+# until the last frame read from it is gone as well; the kernel drops the lock of a
+# process that dies, so a crashed worker never pins a frame. A file is evicted once it
+# has had no holder for SHARED_FRAMES_IDLE_SECONDS, or, oldest first, while the
+# directory is over SHARED_FRAMES_MAX_MB; files that are still attached are never
+# removed. Columns mixing numbers and text are stored as text (arrow_compatible);
+# frames that still cannot be shared are counted in registry_info().
+_default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHARED_FRAMES = os.environ.get("SHARED_FRAMES", "1") == "1"
+SHARED_FRAMES_DIR = os.environ.get("SHARED_FRAMES_DIR", os.path.join(_default_dir, "employee_dashboard_frames"))
+SHARED_FRAMES_IDLE_SECONDS = int(os.environ.get("SHARED_FRAMES_IDLE_SECONDS", 30 * 60))
+SHARED_FRAMES_MAX_MB = int(os.environ.get("SHARED_FRAMES_MAX_MB", 1024))
+
+_leases = {}
+_failures = {'count': 0, 'last_error': None}
+_lock = threading.Lock()
+
+
+def enabled():
+    return SHARED_FRAMES and pa is not None
+
+
+def _path(key):
+    return os.path.join(SHARED_FRAMES_DIR, f"{key}.arrow")
+
+
+def _touch(fd):
+    try:
+        os.utime(fd)
+    except OSError:
+        pass
+
+
+def attach(key):
+    # The registered frame for `key`, backed by the shared mapping, or None. Callers must
+    # not modify it in place (with copy-on-write pandas a shallow copy is enough); each
+    # successful attach() is paired with a release(key).
+    if not enabled():
+        return None
+    with _lock:
+        lease = _leases.get(key)
+        if lease is not None:
+            lease['count'] += 1
+            return lease['df']
+
+    try:
+        fd = os.open(_path(key), os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        if os.fstat(fd).st_nlink == 0:  # evicted between open and lock
+            os.close(fd)
+            return None
+        # Map the open descriptor, not the path: a concurrent replace cannot swap the
+        # file. The mapping stays open for as long as the frame's buffers reference it.
+        mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        df = pa.ipc.open_file(pa.py_buffer(mapped)).read_all().to_pandas(split_blocks=True)
+    except (OSError, ValueError, pa.ArrowException):
+        os.close(fd)
+        return None
+    _touch(fd)
+
+    with _lock:
+        lease = _leases.get(key)
+        if lease is not None:  # another thread attached meanwhile; keep one lock per key
+            lease['count'] += 1
+            os.close(fd)
+            return lease['df']
+        _leases[key] = {'count': 1, 'fd': fd, 'df': df}
+    return df
+
+
+def release(key):
+    with _lock:
+        lease = _leases.get(key)
+        if lease is None:
+            return
+        lease['count'] -= 1
+        if lease['count'] > 0:
+            return
+        del _leases[key]
+    # Frames already handed out stay readable (and keep the file locked): the mapping
+    # lives as long as its buffers
+    _touch(lease['fd'])
+    os.close(lease['fd'])
+
+
+def release_all():
+    with _lock:
+        keys = list(_leases)
+    for key in keys:
+        while key in _leases:
+            release(key)
+
+
+def registered(key):
+    return enabled() and os.path.exists(_path(key))
+
+
+def _failed(key, reason):
+    with _lock:
+        _failures['count'] += 1
+        _failures['last_error'] = f"{key}: {reason}"
+    return False
+
+
+def publish(key, df):
+    # Writes the frame under `key` unless it is already registered. Returns False when
+    # the frame cannot be shared (pyarrow missing, types Arrow cannot hold, disk full);
+    # the caller then keeps its private copy.
+    if not enabled():
+        return False
+    path = _path(key)
+    if os.path.exists(path):
+        return True
+    try:
+        table = pa.Table.from_pandas(arrow_compatible(df))
+        if table.nbytes > SHARED_FRAMES_MAX_MB * 1024 * 1024:
+            return _failed(key, f"{table.nbytes} bytes is over SHARED_FRAMES_MAX_MB")
+        os.makedirs(SHARED_FRAMES_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=SHARED_FRAMES_DIR, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f, pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+        return _failed(key, f"{type(e).__name__}: {e}")
+    evict()
+    return True
+
+
+def _evict_file(path):
+    # Removes the file only if no process holds it
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)  # also drops the lock
+
+
+def evict(now=None):
+    # Idle eviction plus the size cap; returns the number of files removed. Also clears
+    # temp files left by a writer that died mid-publish.
+    now = time.time() if now is None else now
+    files = []
+    try:
+        for entry in os.scandir(SHARED_FRAMES_DIR):
+            info = entry.stat()
+            if entry.name.endswith(".arrow"):
+                files.append((info.st_mtime, info.st_size, entry.path))
+            elif entry.name.endswith(".tmp") and now - info.st_mtime > SHARED_FRAMES_IDLE_SECONDS:
+                os.remove(entry.path)
+    except OSError:
+        pass
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, path in files:
+        over_size = total > SHARED_FRAMES_MAX_MB * 1024 * 1024
+        if (over_size or now - mtime > SHARED_FRAMES_IDLE_SECONDS) and _evict_file(path):
+            total -= size
+            removed += 1
+    return removed
+
+
+def registry_info():
+    try:
+        sizes = [e.stat().st_size for e in os.scandir(SHARED_FRAMES_DIR) if e.name.endswith(".arrow")]
+    except OSError:
+        sizes = []
+    with _lock:
+        attached = len(_leases)
+        failures = dict(_failures)
+    return {"enabled": enabled(), "dir": SHARED_FRAMES_DIR, "frames": len(sizes), "bytes": sum(sizes),
+            "attached": attached, "publish_failures": failures['count'], "last_publish_error": failures['last_error']}
@@ -0,0 +1,134 @@
+# streaming.py
+import io
+import itertools
+import os
+
+import openpyxl
+import pandas as pd
+
+from aggregates import compute_aggregates_chunked, dashboard_metrics
+from features import add_absent_and_risk
+from ingest import HEADER_SCAN_ROWS, clean_column_names, score_header_row
+from schema import NUMERIC_ROLES, resolve_schema
+
+# Bounded-memory reader for very large workbooks. openpyxl's read-only mode walks the
+# sheet XML row by row, and rows are handed out as typed DataFrame chunks of
+# CHUNK_ROWS rows, so peak memory follows the chunk size rather than the file size.
+# The dashboard (app.py) summarizes workbooks of STREAM_MIN_MB or more this way
+# instead of loading them whole.
+CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 50000))
+STREAM_MIN_BYTES = int(os.environ.get("STREAM_MIN_MB", 100)) * 1024 * 1024
+
+
+def should_stream(path):
+    try:
+        return os.path.getsize(path) >= STREAM_MIN_BYTES
+    except OSError:
+        return False
+
+
+def _open(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def _is_blank(row):
+    return all(v is None or (isinstance(v, str) and not v.strip()) for v in row)
+
+
+def _pick_header(rows, header_row):
+    # Returns (header values, iterator over the data rows that follow it)
+    if header_row != 'auto':
+        rows = itertools.islice(rows, header_row, None)
+        return next(rows, ()), rows
+    preview = list(itertools.islice(rows, HEADER_SCAN_ROWS))
+    scores = [score_header_row(row) for row in preview]
+    best = scores.index(max(scores)) if scores and max(scores) > 0 else 0
+    if not preview:
+        return (), rows
+    return preview[best], itertools.chain(preview[best + 1:], rows)
+
+
+def _header_names(header):
+    names = []
+    for i, value in enumerate(header):
+        names.append(str(value) if value is not None else f"Unnamed: {i}")
+    return clean_column_names(names)
+
+
+def _to_frame(buffer, columns, numeric_cols):
+    chunk = pd.DataFrame.from_records(buffer, columns=columns).infer_objects()
+    # Keep dtypes stable across chunks: the schema's numeric roles, and columns that
+    # were numeric in the first chunk, are numeric in every chunk (blanks and stray
+    # text become NaN), even when a chunk holds no number in them at all
+    for col in numeric_cols:
+        if not pd.api.types.is_numeric_dtype(chunk[col]):
+            chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    return chunk
+
+
+def iter_workbook_chunks(source, header_row=0, chunk_rows=CHUNK_ROWS, sheet=None):
+    # source: raw bytes, a path or a file object. header_row may be 'auto'.
+    wb = _open(source)
+    try:
+        ws = wb[sheet] if sheet else wb.active
+        header, rows = _pick_header(ws.iter_rows(values_only=True), header_row)
+        columns = _header_names(header)
+        width = len(columns)
+        if not width:
+            return
+
+        schema = resolve_schema(pd.DataFrame(columns=columns))
+        role_cols = [getattr(schema, role) for role in NUMERIC_ROLES if getattr(schema, role) is not None]
+        numeric_cols = None
+        buffer = []
+        for row in rows:
+            if _is_blank(row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                chunk = _to_frame(buffer, columns, numeric_cols or role_cols)
+                if numeric_cols is None:
+                    numeric_cols = list(dict.fromkeys(
+                        role_cols + [c for c in columns if pd.api.types.is_numeric_dtype(chunk[c])]))
+                buffer = []
+                yield chunk
+        if buffer:
+            yield _to_frame(buffer, columns, numeric_cols or role_cols)
+    finally:
+        wb.close()
+
+
+def peek_chunks(chunks):
+    # Returns (first chunk, iterator over all chunks) so callers can resolve the schema
+    # from the first chunk before streaming the rest
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return None, iter(())
+    return first, itertools.chain([first], chunks)
+
+
+def summarize_workbook(source, header_row=0, chunk_rows=CHUNK_ROWS, top_n=None):
+    # Dashboard aggregates for a workbook too large to load whole: the schema comes from
+    # the first chunk, then derived columns and aggregates are computed chunk by chunk.
+    # Returns (schema, aggregates, row count).
+    first, chunks = peek_chunks(iter_workbook_chunks(source, header_row, chunk_rows))
+    if first is None:
+        return None, {}, 0
+    schema = resolve_schema(first)
+    derived = schema.with_columns(absent=schema.absent or ('Absent' if schema.has('present', 'total_days') else None))
+    with_risk = derived.has('absent', 'penalty', 'salary')
+    rows = [0]
+
+    def prepared():
+        for chunk in chunks:
+            add_absent_and_risk(chunk, schema)
+            rows[0] += len(chunk)
+            yield chunk
+
+    aggregates = compute_aggregates_chunked(prepared(), dashboard_metrics(derived, with_risk, top_n),
+                                            schema.name)
+    return derived, aggregates, rows[0]
@@ -0,0 +1,170 @@
+# table_paging.py
+import math
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+import shared_frames
+
+# Server-side backing store for DataTables with page_action/sort_action/filter_action
+# set to 'custom'. The full frame stays here; each page request only ships the
+# visible slice. Sort orders are computed once per column and direction and kept as
+# positional indexes, so paging through a sorted table never re-sorts.
+# Tables are registered in shared_frames, so page/sort/filter requests can land on any
+# server worker, and a table lives until it has been idle for
+# SHARED_FRAMES_IDLE_SECONDS. Each process keeps its MAX_TABLES most recently used
+# tables attached (with their sort orders); dropping one only drops the attachment.
+# Without shared_frames (no pyarrow, SHARED_FRAMES=0, or a frame over its size cap) the
+# table lives in the registering process only.
+MAX_TABLES = 32
+
+_tables = OrderedDict()
+_lock = threading.Lock()
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+FILTER_OPERATORS = [['ge ', '>='],
+                    ['le ', '<='],
+                    ['lt ', '<'],
+                    ['gt ', '>'],
+                    ['ne ', '!='],
+                    ['eq ', '='],
+                    ['contains '],
+                    ['datestartswith ']]
+
+
+def _shared_key(table_id):
+    return f"table-{table_id}"
+
+
+def _keep(table_id, df, leased):
+    # Adds the table to this process's cache; leased: df came from shared_frames.attach
+    dropped = []
+    with _lock:
+        entry = _tables.get(table_id)
+        if entry is None:
+            entry = _tables[table_id] = {'df': df, 'orders': {}, 'leased': leased}
+        elif leased:  # another thread attached it meanwhile
+            dropped.append((table_id, True))
+        _tables.move_to_end(table_id)
+        while len(_tables) > MAX_TABLES:
+            old_id, old = _tables.popitem(last=False)
+            dropped.append((old_id, old['leased']))
+    for old_id, old_leased in dropped:
+        if old_leased:
+            shared_frames.release(_shared_key(old_id))
+    return entry
+
+
+def register_table(df):
+    table_id = uuid.uuid4().hex
+    df = df.reset_index(drop=True)
+    shared = None
+    if shared_frames.publish(_shared_key(table_id), df):
+        shared = shared_frames.attach(_shared_key(table_id))
+    _keep(table_id, df if shared is None else shared, shared is not None)
+    return table_id
+
+
+def _get(table_id):
+    if not isinstance(table_id, str) or not _ID_PATTERN.match(table_id):
+        return None
+    with _lock:
+        entry = _tables.get(table_id)
+        if entry is not None:
+            _tables.move_to_end(table_id)
+            return entry
+    # Registered by another worker (or dropped from this process's cache)
+    df = shared_frames.attach(_shared_key(table_id))
+    return None if df is None else _keep(table_id, df, True)
+
+
+def get_table(table_id):
+    # The registered frame (read-only), or None once it has been evicted
+    entry = _get(table_id)
+    return None if entry is None else entry['df']
+
+
+def _sort_order(entry, column, ascending):
+    key = (column, ascending)
+    order = entry['orders'].get(key)
+    if order is None:
+        values = entry['df'][column]
+        try:
+            order = values.sort_values(ascending=ascending, kind='stable').index.to_numpy()
+        except TypeError:
+            # Mixed types (e.g. numbers and '' after fillna): fall back to text order
+            order = values.astype(str).sort_values(ascending=ascending, kind='stable').index.to_numpy()
+        entry['orders'][key] = order
+    return order
+
+
+def split_filter_part(filter_part):
+    # Dash filter syntax, e.g. "{Present Days} ge 20" or "{EmployeeName} contains Ram".
+    # The operator is the token right after the column name, so values that contain an
+    # operator word ({Plant} eq "Storage Yard") are left intact.
+    start, end = filter_part.find('{'), filter_part.find('}')
+    if start < 0 or end < start:
+        return [None] * 3
+    name = filter_part[start + 1: end]
+    rest = filter_part[end + 1:].lstrip()
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator):].strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return [None] * 3
+
+
+def filter_mask(df, filter_query):
+    mask = np.ones(len(df), dtype=bool)
+    for filter_part in (filter_query or '').split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        column = df[col_name]
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            try:
+                part = getattr(column, operator)(filter_value)
+            except TypeError:
+                part = getattr(column.astype(str), operator)(str(filter_value))
+        elif operator == 'contains':
+            part = column.astype(str).str.contains(str(filter_value), case=False, regex=False)
+        elif operator == 'datestartswith':
+            part = column.astype(str).str.startswith(str(filter_value))
+        else:
+            continue
+        mask &= part.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def get_page(table_id, page_current, page_size, sort_by=None, filter_query=''):
+    # Returns (records, page_count) for one DataTable page request
+    entry = _get(table_id)
+    if entry is None:
+        return [], 0
+    df = entry['df']
+    page_current = page_current or 0
+
+    mask = filter_mask(df, filter_query)
+    if sort_by:
+        order = _sort_order(entry, sort_by[0]['column_id'], sort_by[0]['direction'] == 'asc')
+        rows = order[mask[order]]
+    else:
+        rows = np.flatnonzero(mask)
+
+    page_count = max(math.ceil(len(rows) / page_size), 1)
+    page_rows = rows[page_current * page_size: (page_current + 1) * page_size]
+    return df.iloc[page_rows].to_dict('records'), page_count
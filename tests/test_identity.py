@@ -0,0 +1,65 @@
+# test_identity.py
+import importlib
+import os
+
+import pandas as pd
+import pytest
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "cleaned_attendance_summary.xlsx")
+
+# Different employees (different EP.NO) in cleaned_attendance_summary.xlsx whose names
+# are one token, or one spelling, apart
+DISTINCT_PAIRS = [
+    ("MAHESH PARMAR", "MAHESH S PARMAR"),
+    ("BARIA ARVINDABHAI", "BARIA ARVINDBHAI"),
+    ("PATHAN LIYAKATKHAN", "PATHAN LIYAKTKHAN"),
+    ("BARIA MAHESHBHAI", "BARIYA MAHESHBHAI"),
+]
+
+
+@pytest.fixture
+def identity(tmp_path, monkeypatch):
+    monkeypatch.setenv("IDENTITY_INDEX_PATH", str(tmp_path / "identity.json"))
+    import identity
+    return importlib.reload(identity)
+
+
+@pytest.mark.parametrize("first, second", DISTINCT_PAIRS)
+def test_names_in_one_file_are_never_merged(identity, first, second):
+    ids = identity.assign_employee_ids(pd.Series([first, second]), groups=[['jan.xlsx', 'jan.xlsx']])
+    assert ids[0] != ids[1]
+
+
+@pytest.mark.parametrize("first, second", DISTINCT_PAIRS)
+def test_known_names_keep_their_own_ids(identity, first, second):
+    ids = identity.assign_employee_ids(pd.Series([first, second]), groups=[['jan.xlsx', 'jan.xlsx']])
+    later = identity.assign_employee_ids(pd.Series([second, first]), groups=[['feb.xlsx', 'feb.xlsx']])
+    assert list(later) == [ids[1], ids[0]]
+
+
+def test_an_extra_initial_is_another_name(identity):
+    ids = identity.assign_employee_ids(pd.Series(["MAHESH PARMAR"]))
+    later = identity.assign_employee_ids(pd.Series(["MAHESH S PARMAR"]))
+    assert later[0] != ids[0]
+
+
+def test_spelling_variants_across_months_match(identity):
+    ids = identity.assign_employee_ids(pd.Series(["Rakesh Chauhan", "Sunil Vasava"]), groups=[['jan', 'jan']])
+    later = identity.assign_employee_ids(pd.Series(["RAKESH  CHAUHAN.", "Sunil Vasawa"]), groups=[['feb', 'feb']])
+    assert list(later) == list(ids)
+
+
+def test_employee_numbers_are_the_key(identity):
+    names = pd.Series(["MAHESH PARMAR", "MAHESH PARMAR", "Mahesh Parmaar"])
+    ids = identity.assign_employee_ids(names, numbers=["PP1", "PP2", 'pp1 '])
+    assert ids[0] != ids[1] and ids[0] == ids[2]
+
+
+@pytest.mark.skipif(not os.path.exists(WORKBOOK), reason="sample workbook not present")
+def test_shipped_workbook_keeps_every_employee(identity):
+    df = pd.read_excel(WORKBOOK)
+    by_name = identity.assign_employee_ids(df['NAME'], groups=[['summary'] * len(df)])
+    assert by_name.nunique() == df['NAME'].str.upper().str.split().str.join(' ').nunique()
+    by_number = identity.assign_employee_ids(df['NAME'], df['EP.NO'])
+    assert by_number.nunique() == df['EP.NO'].nunique()
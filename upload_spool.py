@@ -0,0 +1,182 @@
+# upload_spool.py
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from urllib.parse import unquote
+
+from dash import Input, Output, State
+from flask import jsonify, request
+
+from ingest import load_files
+
+# Raw-bytes upload path. The browser POSTs each selected workbook once, as binary, to
+# UPLOAD_ROUTE; the server streams the body to UPLOAD_SPOOL_DIR in UPLOAD_CHUNK_BYTES
+# chunks and answers with an upload ID (the content hash). Callbacks then carry only
+# the IDs, and workbooks are parsed straight from the spooled file. dcc.Upload still
+# reads the file in the browser, but its base64 contents never travel to the server.
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR",
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), ".upload_spool"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_MB", 200)) * 1024 * 1024
+UPLOAD_TTL_SECONDS = int(os.environ.get("UPLOAD_TTL_SECONDS", 24 * 3600))
+UPLOAD_ROUTE = 'upload'
+
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Runs in the browser: clear the store, turn each data URL back into bytes, POST it to
+# the spool and store the upload IDs with the filenames they belong to (always lists).
+# A failed POST (e.g. 413 over UPLOAD_MAX_MB, or a body that is not JSON) stores a null
+# ID and the reason under `errors`; read it back with upload_error().
+_UPLOAD_JS = """
+async function(contents, filenames) {
+    window.dash_clientside.set_props('%(store)s', {data: null});
+    if (!contents) { return null; }
+    const files = Array.isArray(contents) ? contents : [contents];
+    const names = Array.isArray(filenames) ? filenames : [filenames];
+    const ids = [];
+    const errors = [];
+    for (let i = 0; i < files.length; i++) {
+        let id = null, error = null;
+        try {
+            const blob = await (await fetch(files[i])).blob();
+            const response = await fetch('%(url)s', {
+                method: 'POST', body: blob,
+                headers: {'Content-Type': 'application/octet-stream', 'X-Filename': encodeURIComponent(names[i] || '')}
+            });
+            let body = null;
+            try { body = await response.json(); } catch (e) { }
+            if (response.ok && body && body.upload_id) {
+                id = body.upload_id;
+            } else {
+                error = (body && body.error) || ('HTTP ' + response.status + ' ' + response.statusText).trim();
+            }
+        } catch (e) {
+            error = String((e && e.message) || e);
+        }
+        ids.push(id);
+        errors.push(error);
+    }
+    return {filenames: names, ids: ids, errors: errors};
+}
+"""
+
+
+def _paths(upload_id):
+    return (os.path.join(UPLOAD_SPOOL_DIR, f"{upload_id}.xlsx"),
+            os.path.join(UPLOAD_SPOOL_DIR, f"{upload_id}.json"))
+
+
+def spool_path(upload_id):
+    # Path of a spooled upload, or None for an unknown, expired or malformed ID
+    if not isinstance(upload_id, str) or not _ID_PATTERN.match(upload_id):
+        return None
+    path = _paths(upload_id)[0]
+    return path if os.path.exists(path) else None
+
+
+def current_upload_ids(stored, filenames):
+    # The upload IDs in the store if they belong to the current selection (`filenames`,
+    # a name or a list), else None. The store only fills once the POSTs finish, so
+    # Analyze may run while it is empty or still holds the previous selection.
+    if not stored or not filenames:
+        return None
+    names = [filenames] if isinstance(filenames, str) else list(filenames)
+    return stored.get('ids') if stored.get('filenames') == names else None
+
+
+def upload_error(stored, filenames):
+    # Message naming the files of the current selection whose POST failed, else None
+    if current_upload_ids(stored, filenames) is None:
+        return None
+    failed = [f"{name} ({error})" for name, error in zip(stored['filenames'], stored.get('errors') or ()) if error]
+    return f"❌ Upload failed: {', '.join(failed)}" if failed else None
+
+
+def _purge_expired():
+    cutoff = time.time() - UPLOAD_TTL_SECONDS
+    try:
+        entries = os.scandir(UPLOAD_SPOOL_DIR)
+    except OSError:
+        return
+    with entries:
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def spool_stream(stream, filename=''):
+    # Copies a binary stream to the spool chunk by chunk. Returns (upload ID, size);
+    # raises ValueError when the body exceeds UPLOAD_MAX_BYTES.
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_SPOOL_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for block in iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b''):
+                size += len(block)
+                if size > UPLOAD_MAX_BYTES:
+                    raise ValueError(f"Upload exceeds {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+                h.update(block)
+                f.write(block)
+        upload_id = h.hexdigest()
+        path, meta = _paths(upload_id)
+        # Content-addressed: re-uploading the same workbook keeps a single copy
+        os.replace(tmp, path)
+        with open(meta, 'w') as f:
+            json.dump({'filename': filename, 'size': size, 'uploaded': time.time()}, f)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return upload_id, size
+
+
+def load_spooled(upload_ids, header_row=0, filenames=None):
+    # ingest.load_files over spooled uploads; an unknown or expired ID is reported as
+    # a per-file error. Returns (frames, errors) like ingest.load_files.
+    filenames = filenames or [f"file {i + 1}" for i in range(len(upload_ids))]
+    frames = [None] * len(upload_ids)
+    errors = []
+    found = [(i, spool_path(upload_id), upload_id) for i, upload_id in enumerate(upload_ids)]
+    for i, path, _ in found:
+        if path is None:
+            errors.append((filenames[i], "Upload not found; please upload the file again"))
+    found = [entry for entry in found if entry[1] is not None]
+    if found:
+        parsed, parse_errors = load_files([path for _, path, _ in found], header_row,
+                                          [filenames[i] for i, _, _ in found],
+                                          keys=[upload_id for _, _, upload_id in found])
+        for (i, _, _), df in zip(found, parsed):
+            frames[i] = df
+        errors += parse_errors
+    return frames, errors
+
+
+def register_upload_spool(app, upload_id='upload-data', store_id='upload-ids'):
+    # Adds the upload route to the app's Flask server (once) and a clientside callback
+    # that spools every new selection of `upload_id` and stores the IDs in `store_id`;
+    # read them back with current_upload_ids() and upload_error()
+    route = app.config.routes_pathname_prefix + UPLOAD_ROUTE
+    if route not in {rule.rule for rule in app.server.url_map.iter_rules()}:
+        def receive_upload():
+            filename = unquote(request.headers.get('X-Filename', ''))
+            try:
+                spooled, size = spool_stream(request.stream, filename)
+            except ValueError as e:
+                return jsonify(error=str(e)), 413
+            _purge_expired()
+            return jsonify(upload_id=spooled, size=size)
+        app.server.add_url_rule(route, 'receive_upload', receive_upload, methods=['POST'])
+
+    app.clientside_callback(
+        _UPLOAD_JS % {'url': app.config.requests_pathname_prefix + UPLOAD_ROUTE, 'store': store_id},
+        Output(store_id, 'data'),
+        Input(upload_id, 'contents'),
+        State(upload_id, 'filename')
+    )
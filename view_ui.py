@@ -0,0 +1,148 @@
+# view_ui.py
+import os
+
+import dash
+from dash import dcc, html, Input, Output, State, ALL, Patch
+import plotly.express as px
+
+from aggregates import compute_aggregates, top
+from table_paging import get_table
+
+# Interactive controls over a finished analysis, shared by the apps. The analysis keeps
+# the top VIEW_TOP_N_MAX rows of every top-N chart in a store in the page; the top-N
+# slider re-slices the charts in the browser (a clientside callback, no request), and
+# the department filter recomputes only those candidate rows on the server and sends
+# them back as a Patch of the store. Nothing is re-parsed, re-modelled or re-rendered.
+# Component IDs are prefixed like the job panel's:
+#   {prefix}-top-n, {prefix}-dept   the controls
+#   {prefix}-spec                   chart metadata (frame ID, columns, titles, initial
+#                                   top-N per chart) and the slider's value once moved
+#   {prefix}-view                   candidate rows and the current filter
+#   {'type': '{prefix}-top-chart', 'key': ...}  the top-N graphs
+VIEW_TOP_N_MAX = int(os.environ.get("VIEW_TOP_N_MAX", 25))
+TOP_N_DEFAULT = 5
+
+# Each chart shows its own initial top-N (spec.charts[key].n) until the slider is first
+# moved; from then on every chart follows the slider, and spec.n records its value.
+_TOP_N_JS = """
+function(n, view, spec, ids, figures) {
+    const clientside = window.dash_clientside, noUpdate = clientside.no_update;
+    if (!view || !spec) { return [ids.map(() => noUpdate), noUpdate]; }
+    const triggered = (clientside.callback_context && clientside.callback_context.triggered) || [];
+    const moved = spec.n != null || triggered.some(t => t.prop_id.endsWith('.value'));
+    const figs = ids.map((id, i) => {
+        const rows = view.top[id.key], chart = spec.charts[id.key], fig = figures[i];
+        if (!rows || !chart || !fig) { return noUpdate; }
+        const count = moved ? n : chart.n;
+        const trace = Object.assign({}, fig.data[0], {x: rows.x.slice(0, count), y: rows.y.slice(0, count)});
+        const text = chart.title.replace('{n}', Math.min(count, rows.x.length)) + (view.filter ? ' (' + view.filter + ')' : '');
+        const layout = Object.assign({}, fig.layout, {title: Object.assign({}, fig.layout.title, {text: text})});
+        return Object.assign({}, fig, {data: [trace].concat(fig.data.slice(1)), layout: layout});
+    });
+    return [figs, moved && spec.n !== n ? Object.assign({}, spec, {n: n}) : noUpdate];
+}
+"""
+
+_TABLE_FILTER_JS = """
+function(dept, spec) {
+    if (!spec || !spec.dept) { return [window.dash_clientside.no_update, window.dash_clientside.no_update]; }
+    const query = dept ? '{' + spec.dept + '} eq "' + String(dept).replace(/"/g, '\\\\"') + '"' : '';
+    return [query, 0];
+}
+"""
+
+
+def _chart(spec):
+    # (value column, title, initial top-N) of a chart spec; the top-N is optional
+    column, title, n = (tuple(spec) + (TOP_N_DEFAULT,))[:3]
+    return column, title, n
+
+
+def top_metrics(charts):
+    # aggregates.top() metrics for {key: (column, title[, n])}, with room for the largest top-N
+    return [top(key, _chart(spec)[0], n=VIEW_TOP_N_MAX) for key, spec in charts.items()]
+
+
+def top_chart(prefix, key, rows, x, y, title, n=TOP_N_DEFAULT, plot=px.bar):
+    # `title` may contain {n}; the figure starts with the first n rows and follows the
+    # top-N slider once it is moved. Pass the same n in the chart's view_panel() spec.
+    fig = plot(rows.head(n), x=x, y=y, title=title.format(n=n))
+    return dcc.Graph(id={'type': f'{prefix}-top-chart', 'key': key}, figure=fig)
+
+
+def _candidates(agg, label_col, charts):
+    return {key: {'x': agg[key][label_col].astype(str).tolist(), 'y': agg[key][_chart(spec)[0]].tolist()}
+            for key, spec in charts.items() if key in agg}
+
+
+def view_panel(prefix, frame_id, label_col, charts, agg, dept_col=None, departments=()):
+    # charts: {key: (value column, title[, initial top-N])} of the top_chart()s on the
+    # page; agg holds their top_metrics(). frame_id is the table_paging ID of a frame with
+    # the label, department and value columns, which the department filter recomputes
+    # from. The slider starts at the charts' common initial top-N (TOP_N_DEFAULT when
+    # they differ).
+    charts = {key: _chart(spec) for key, spec in charts.items()}
+    spec = {'frame': frame_id, 'label': label_col, 'dept': dept_col, 'n': None,
+            'charts': {key: {'column': column, 'title': title, 'n': n} for key, (column, title, n) in charts.items()}}
+    initial = {n for _, _, n in charts.values()}
+    controls = []
+    if charts:
+        controls.append(html.Div([
+            html.Label("Top N"),
+            dcc.Slider(id=f'{prefix}-top-n', min=1, max=VIEW_TOP_N_MAX, step=1,
+                       value=initial.pop() if len(initial) == 1 else TOP_N_DEFAULT,
+                       marks={n: str(n) for n in (1, 5, 10, 15, 20, 25) if n <= VIEW_TOP_N_MAX}),
+        ], style={'width': '45%', 'display': 'inline-block', 'verticalAlign': 'top'}))
+    if dept_col is not None:
+        controls.append(html.Div([
+            html.Label(f"Filter by {dept_col}"),
+            dcc.Dropdown(id=f'{prefix}-dept', options=[{'label': str(d), 'value': str(d)} for d in departments],
+                         placeholder="All"),
+        ], style={'width': '45%', 'display': 'inline-block', 'marginLeft': '5%'}))
+    return html.Div(controls + [
+        dcc.Store(id=f'{prefix}-spec', data=spec),
+        dcc.Store(id=f'{prefix}-view', data={'top': _candidates(agg, label_col, charts), 'filter': None}),
+    ], style={'margin': '10px 0'})
+
+
+def register_view_callbacks(app, prefix, table_id=None):
+    # table_id: a custom-filtered DataTable the department filter also applies to
+    app.clientside_callback(
+        _TOP_N_JS,
+        Output({'type': f'{prefix}-top-chart', 'key': ALL}, 'figure'),
+        Output(f'{prefix}-spec', 'data'),
+        Input(f'{prefix}-top-n', 'value'),
+        Input(f'{prefix}-view', 'data'),
+        State(f'{prefix}-spec', 'data'),
+        State({'type': f'{prefix}-top-chart', 'key': ALL}, 'id'),
+        State({'type': f'{prefix}-top-chart', 'key': ALL}, 'figure'),
+        prevent_initial_call=True
+    )
+
+    @app.callback(
+        Output(f'{prefix}-view', 'data'),
+        Input(f'{prefix}-dept', 'value'),
+        State(f'{prefix}-spec', 'data'),
+        prevent_initial_call=True
+    )
+    def filter_department(dept, spec):
+        df = get_table(spec['frame']) if spec and spec['charts'] else None
+        if df is None:
+            return dash.no_update
+        if dept:
+            df = df[df[spec['dept']].astype(str) == dept]
+        charts = {key: (chart['column'], chart['title'], chart['n']) for key, chart in spec['charts'].items()}
+        view = Patch()
+        view['top'] = _candidates(compute_aggregates(df, top_metrics(charts), spec['label']), spec['label'], charts)
+        view['filter'] = dept
+        return view
+
+    if table_id is not None:
+        app.clientside_callback(
+            _TABLE_FILTER_JS,
+            Output(table_id, 'filter_query'),
+            Output(table_id, 'page_current'),
+            Input(f'{prefix}-dept', 'value'),
+            State(f'{prefix}-spec', 'data'),
+            prevent_initial_call=True
+        )
@@ -0,0 +1,56 @@
+# wsgi.py
+import gc
+import importlib
+import os
+import time
+
+# Production entry point. Importing an app module loads Dash, pandas and plotly and
+# builds that module's Dash instance; scikit-learn and the models load on first use.
+# get_server() selects the dashboard for a preforking WSGI server. It is a lazy accessor,
+# not an app factory: each app module builds its single Dash instance at import, so
+# every call returns that instance's server. With --preload the parent imports it once
+# and warm-loads the lazy imports and plotly's figure code, and the forked workers share
+# those pages copy-on-write instead of each paying the import on its first request:
+#   gunicorn --preload -w 4 "wsgi:get_server()"
+#   DASHBOARD_APP=multi gunicorn --preload -w 4 "wsgi:get_server()"
+APPS = {'dashboard': 'app', 'multi': 'app_multi', 'dual': 'app_dual_upload'}
+DASHBOARD_APP = os.environ.get("DASHBOARD_APP", "dashboard")
+WSGI_WARM_UP = os.environ.get("WSGI_WARM_UP", "1") == "1"
+
+
+def warm_up():
+    # Imports (and runs once, on toy data) what the first analysis would otherwise load
+    # in each worker, then freezes the heap so the collector does not touch, and thereby
+    # un-share, the preloaded objects after fork. Returns the seconds spent.
+    started = time.perf_counter()
+    import pandas as pd
+    import plotly.express as px
+    from plotly.io.json import to_json_plotly
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LinearRegression
+
+    X = pd.DataFrame({'a': [0.0, 1.0, 2.0, 3.0], 'b': [1.0, 0.0, 1.0, 0.0]})
+    y = [0, 1, 0, 1]
+    # n_jobs=1: no worker threads or processes may exist in the parent before fork
+    RandomForestClassifier(n_estimators=2, n_jobs=1, random_state=0).fit(X, y).predict(X)
+    LinearRegression().fit(X, y).predict(X)
+    to_json_plotly(px.bar(X, x='a', y='b'))
+    to_json_plotly(px.scatter(X, x='a', y='b', render_mode='webgl'))
+    to_json_plotly(px.pie(X, names='a', values='b'))
+    to_json_plotly(px.density_heatmap(X, x='a', y='b'))
+
+    gc.collect()
+    gc.freeze()
+    return time.perf_counter() - started
+
+
+def get_server(name=None, warm=WSGI_WARM_UP):
+    # Imports the selected dashboard (see APPS) on first use and returns its module's
+    # Flask server; every call for the same name returns the same server.
+    name = name or DASHBOARD_APP
+    if name not in APPS:
+        raise ValueError(f"Unknown dashboard {name!r}; expected one of {', '.join(APPS)}")
+    module = importlib.import_module(APPS[name])
+    if warm:
+        warm_up()
+    return module.app.server